@@ -0,0 +1,46 @@
+import importlib
+import pkgutil
+import sys
+import timeit
+
+PLAIN = "今天天气不错，大家中午吃什么？" * 20 + "lorem ipsum dolor sit amet " * 30
+LINKS = (
+    PLAIN
+    + " https://x.com/someone/status/1234567890123456789"
+    + " https://b23.tv/AbCdEfG"
+    + " https://www.bilibili.com/video/BV1xx411c7mD"
+)
+
+
+def load_patterns(package: str):
+    impl = importlib.import_module(f"{package}.impl")
+    for info in pkgutil.iter_modules(impl.__path__):
+        importlib.import_module(f"{impl.__name__}.{info.name}")
+    utils = importlib.import_module(f"{package}.utils")
+    matcher = importlib.import_module(f"{package}.matcher")
+    return utils._patterns, matcher.LinkMatcher
+
+
+def main(package: str = "module.link_preview", number: int = 2000):
+    patterns, matcher_cls = load_patterns(package)
+    matcher = matcher_cls(patterns)
+
+    def baseline(text: str) -> list[str]:
+        result = []
+        for pattern in patterns:
+            result.extend(pattern.findall(text))
+        return result
+
+    print(f"{len(patterns)} registered pattern(s)")
+    for name, text in (("without links", PLAIN), ("with 3 links", LINKS)):
+        assert sorted(matcher.findall(text)) == sorted(baseline(text))
+        before = timeit.timeit(lambda: baseline(text), number=number)
+        after = timeit.timeit(lambda: matcher.findall(text), number=number)
+        print(
+            f"{len(text)}-char message {name}: "
+            f"{before / number * 1e6:.0f}us -> {after / number * 1e6:.0f}us"
+        )
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:2])
@@ -1,7 +1,14 @@
 import time
 from contextlib import contextmanager
 from datetime import datetime
-from typing import TYPE_CHECKING, Coroutine, Literal, Self, TypedDict
+from typing import (
+    TYPE_CHECKING,
+    Coroutine,
+    Literal,
+    NotRequired,
+    Self,
+    TypedDict,
+)
 
 from creart import it
 from graia.saya import Saya
@@ -15,6 +22,9 @@ from mephisto.library.util.storage import TemporaryFile
 from mephisto.library.model.metadata import ModuleMetadata
 from mephisto.library.util.playwright import route_fonts
 
+from .favicon import FAVICON_TEMPLATE, favicon_domain, fetch_favicons
+from .thumbnail import load_thumbnail
+
 saya = Saya.current()
 module = ModuleMetadata.current()
 env = Environment(loader=PackageLoader(module.identifier, "templates"), autoescape=True)
@@ -41,6 +51,7 @@ class ImageSearchResultItem(TypedDict):
     mark: Literal["check", "question", "cross"]
     favicon: str | None
     text_checkmark: bool
+    thumbnail: NotRequired[str]
 
 
 class ImageSearchEngineDetails(TypedDict):
@@ -53,19 +64,29 @@ class ImageSearch:
     _exceptions: list[Exception]
     _coroutine: Coroutine | None
     results: list[ImageSearchResultItem]
+    all_results: list[ImageSearchResultItem]
     details: list[ImageSearchEngineDetails]
     temporary_files: list[TemporaryFile]
     min_similarity: float | None
     max_count: int | None
+    page: int
+    offset: int
+    total_count: int
+    elapsed: float | None
 
     def __init__(self):
         self._exceptions = []
         self._coroutine = None
         self.results = []
+        self.all_results = []
         self.details = []
         self.temporary_files = []
         self.min_similarity = None
         self.max_count = None
+        self.page = 1
+        self.offset = 0
+        self.total_count = 0
+        self.elapsed = None
 
     def set_exception(self, exception: Exception) -> Self:
         self._exceptions.append(exception)
@@ -103,7 +124,11 @@ class ImageSearch:
         return await self._coroutine
 
     def merge(
-        self, others: list[Self], min_similarity: float, max_count: int = 30
+        self,
+        others: list[Self],
+        min_similarity: float,
+        max_count: int = 30,
+        page: int = 1,
     ) -> Self:
         for other in others:
             self.results.extend(other.results)
@@ -113,20 +138,74 @@ class ImageSearch:
             key=lambda x: (_MARK_MAP.get(x["mark"], 0), x["similarity"]), reverse=True
         )
         self.details.sort(key=lambda x: x["time"])
-        self.results = [
+        self.temporary_files = list(
+            {id(file): file for file in self.temporary_files}.values()
+        )
+        self.all_results = self.results
+        return self.filter(min_similarity, max_count, page)
+
+    def filter(self, min_similarity: float, max_count: int = 30, page: int = 1) -> Self:
+        results = [
             result
-            for result in self.results
+            for result in self.all_results
             if result["similarity"] >= min_similarity or result["mark"] == "check"
         ]
-        self.results = self.results[:max_count]
+        self.offset = max_count * (page - 1)
+        self.results = results[self.offset : self.offset + max_count]
+        self.total_count = len(results)
         self.min_similarity = min_similarity
         self.max_count = max_count
+        self.page = page
         return self
 
+    def dump(self) -> dict:
+        return {
+            "results": [
+                {
+                    key: value
+                    for key, value in result.items()
+                    if key not in ("image", "favicon", "text_checkmark", "index")
+                }
+                for result in self.all_results
+            ],
+            "details": self.details,
+            "elapsed": self.elapsed,
+        }
+
+    @classmethod
+    def load(cls, data: dict) -> Self:
+        instance = cls()
+        for result in data["results"]:
+            thumbnail = load_thumbnail(result.get("thumbnail", ""))
+            if thumbnail is not None:
+                instance.temporary_files.append(thumbnail)
+            instance.all_results.append(
+                ImageSearchResultItem(
+                    **result,
+                    image=thumbnail.internal_url if thumbnail is not None else "",
+                    favicon=None,
+                    text_checkmark=False,
+                )
+            )
+        instance.details = data["details"]
+        instance.elapsed = data["elapsed"]
+        return instance
+
     async def render(
         self, start_time: datetime, width: int = 720, device_scale_factor=1.5
     ) -> bytes:
-        for file in self.temporary_files:
+        favicons = await fetch_favicons(
+            {URL(result["url"]).host for result in self.results}
+            | {favicon_domain(result["engine_icon"]) for result in self.results}
+        )
+
+        def local_favicon(domain: str | None) -> str:
+            if file := favicons.get(domain):
+                return file.internal_url
+            return FAVICON_TEMPLATE.format(domain=domain)
+
+        favicon_files = [file for file in favicons.values() if file is not None]
+        for file in [*self.temporary_files, *favicon_files]:
             file.__enter__()
 
         try:
@@ -135,33 +214,40 @@ class ImageSearch:
                 additional["min_similarity"] = self.min_similarity
             if self.max_count:
                 additional["max_count"] = self.max_count
+            if self.max_count and self.total_count > len(self.results):
+                additional["title"] = (
+                    f"第 {self.page} / {-(-self.total_count // self.max_count)} 页"
+                    f" · 共 {self.total_count} 条结果"
+                )
+            if self.elapsed is None:
+                self.elapsed = (datetime.now() - start_time).total_seconds()
 
             template = env.get_template("template.jinja")
-            for index, result in enumerate(self.results):
+            results = [dict(result) for result in self.results]
+            details = [dict(detail) for detail in self.details]
+            for index, result in enumerate(results):
                 result["similarity"] = round(result["similarity"], 2)  # type: ignore
-                result["index"] = index + 1
-                result["favicon"] = (
-                    f"https://www.google.com/s2/favicons?domain="
-                    + URL(result["url"]).host  # type: ignore
+                result["index"] = self.offset + index + 1
+                result["favicon"] = local_favicon(URL(result["url"]).host)
+                result["engine_icon"] = local_favicon(
+                    favicon_domain(result["engine_icon"])
                 )
                 result["text_checkmark"] = can_preview(result["url"])  # type: ignore
-            for detail in self.details:
+            for detail in details:
                 detail["time"] = f"{detail['time']:.2f}".zfill(5)
-            if len(self.results) == 1:
+            if len(results) == 1:
                 column_count = 1
-            elif len(self.results) < 10:
+            elif len(results) < 10:
                 column_count = 2
             else:
                 column_count = 3
             html_string = template.render(
                 column_count=column_count,
                 details={
-                    "search_details": self.details,
-                    "total_time": f"{(datetime.now() - start_time).total_seconds():.2f}".zfill(
-                        5
-                    ),
+                    "search_details": details,
+                    "total_time": f"{self.elapsed:.2f}".zfill(5),
                 },
-                results=self.results,
+                results=results,
                 _meta={
                     "render_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                     "search_time": start_time.strftime("%Y-%m-%d %H:%M:%S"),
@@ -189,5 +275,5 @@ class ImageSearch:
             logger.exception(e)
             raise
         finally:
-            for file in self.temporary_files:
+            for file in [*self.temporary_files, *favicon_files]:
                 file.__exit__(None, None, None)
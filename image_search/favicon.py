@@ -0,0 +1,90 @@
+import asyncio
+import time
+from typing import Final
+
+from kayaku import config, create
+from loguru import logger
+from yarl import URL
+
+from mephisto.library.model.metadata import ModuleMetadata
+from mephisto.library.util.storage import File, TemporaryFile, download_file
+
+module = ModuleMetadata.current()
+
+FAVICON_TEMPLATE: Final[str] = "https://www.google.com/s2/favicons?domain={domain}"
+
+
+@config(f"{module.identifier}.favicon")
+class FaviconConfig:
+    ttl: int = 30 * 24 * 60 * 60
+    retry_after: int = 60 * 60
+
+
+_preload: set[str] = set()
+_failed: dict[str, float] = {}
+_pending: dict[str, asyncio.Task] = {}
+
+
+def favicon_domain(icon: str) -> str | None:
+    url = URL(icon)
+    if "domain" in url.query:
+        return url.query["domain"]
+    return url.host
+
+
+def register_favicon(icon: str):
+    if domain := favicon_domain(icon):
+        _preload.add(domain)
+
+
+def _favicon_file(domain: str) -> File:
+    return File(*module.identifier.split("."), "favicon", domain)
+
+
+async def _download_favicon(domain: str) -> File | None:
+    file = _favicon_file(domain)
+    try:
+        data = await download_file(
+            URL(FAVICON_TEMPLATE.format(domain=domain)),
+            session_name=module.identifier,
+        )
+    except Exception as e:
+        logger.warning(f"[ImageSearch] Failed to download favicon for {domain}: {e}")
+        _failed[domain] = time.time()
+        return file if file.exists else None
+    file.write_bytes(data)
+    _failed.pop(domain, None)
+    logger.debug(f"[ImageSearch] Updated favicon cache: {domain}")
+    return file
+
+
+async def fetch_favicon(domain: str) -> TemporaryFile | None:
+    cfg: FaviconConfig = create(FaviconConfig)
+    file = _favicon_file(domain)
+    if file.exists and time.time() - file.path.stat().st_mtime < cfg.ttl:
+        return TemporaryFile.from_file(file.path)
+    if time.time() - _failed.get(domain, 0) < cfg.retry_after:
+        return TemporaryFile.from_file(file.path) if file.exists else None
+    if (task := _pending.get(domain)) is None:
+        task = _pending[domain] = asyncio.create_task(_download_favicon(domain))
+        task.add_done_callback(lambda _: _pending.pop(domain, None))
+    if (file := await asyncio.shield(task)) is None:
+        return None
+    return TemporaryFile.from_file(file.path)
+
+
+async def fetch_favicons(domains: set[str | None]) -> dict[str, TemporaryFile | None]:
+    targets = [domain for domain in domains if domain]
+    files = await asyncio.gather(
+        *[fetch_favicon(domain) for domain in targets], return_exceptions=True
+    )
+    return {
+        domain: file if isinstance(file, TemporaryFile) else None
+        for domain, file in zip(targets, files)
+    }
+
+
+async def preload_favicons():
+    logger.info(f"[ImageSearch] Preloading {len(_preload)} favicon(s)")
+    await fetch_favicons(_preload)
+    logger.success("[ImageSearch] Preloaded favicons")
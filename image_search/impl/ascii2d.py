@@ -8,6 +8,7 @@ from PicImageSearch import Ascii2D
 from mephisto.library.model.metadata import ModuleMetadata
 
 from ..base import ImageSearch
+from ..favicon import register_favicon
 from ..utils import general_image_search, impl_engine
 from .base import BaseConfig
 
@@ -16,6 +17,8 @@ module = ModuleMetadata.current()
 NAME: Final[str] = "Ascii2D"
 ICON: Final[str] = "https://www.google.com/s2/favicons?domain=ascii2d.net"
 
+register_favicon(ICON)
+
 
 @config(f"{module.identifier}.source.ascii2d")
 class Ascii2DConfig(BaseConfig):
@@ -25,7 +28,9 @@ class Ascii2DConfig(BaseConfig):
 
 @global_collect
 @impl_engine(engine="ascii2d")
-def ascii2d_image(engine: str | None, file: Path) -> ImageSearch | None:
+def ascii2d_image(
+    engine: str | None, file: Path, url: str | None = None
+) -> ImageSearch | None:
     cfg: Ascii2DConfig = create(Ascii2DConfig, flush=True)
     if not cfg.enabled:
         return None
@@ -38,5 +43,6 @@ def ascii2d_image(engine: str | None, file: Path) -> ImageSearch | None:
             icon=ICON,
             file=file,
             max_page=cfg.max_page,
+            url=url,
         )
     )
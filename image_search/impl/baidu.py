@@ -8,6 +8,7 @@ from PicImageSearch import BaiDu
 from mephisto.library.model.metadata import ModuleMetadata
 
 from ..base import ImageSearch
+from ..favicon import register_favicon
 from ..utils import general_image_search, impl_engine
 from .base import BaseConfig
 
@@ -16,6 +17,8 @@ module = ModuleMetadata.current()
 NAME: Final[str] = "Baidu"
 ICON: Final[str] = "https://www.google.com/s2/favicons?domain=baidu.com"
 
+register_favicon(ICON)
+
 
 @config(f"{module.identifier}.source.baidu")
 class BaiduConfig(BaseConfig): ...
@@ -23,7 +26,9 @@ class BaiduConfig(BaseConfig): ...
 
 @global_collect
 @impl_engine(engine="baidu")
-def baidu_image(engine: str | None, file: Path) -> ImageSearch | None:
+def baidu_image(
+    engine: str | None, file: Path, url: str | None = None
+) -> ImageSearch | None:
     cfg: BaiduConfig = create(BaiduConfig, flush=True)
     if not cfg.enabled:
         return None
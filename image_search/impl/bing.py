@@ -8,6 +8,7 @@ from PicImageSearch import Bing
 from mephisto.library.model.metadata import ModuleMetadata
 
 from ..base import ImageSearch
+from ..favicon import register_favicon
 from ..utils import general_image_search, impl_engine
 from .base import BaseConfig
 
@@ -16,6 +17,8 @@ module = ModuleMetadata.current()
 NAME: Final[str] = "Bing"
 ICON: Final[str] = "https://www.google.com/s2/favicons?domain=bing.com"
 
+register_favicon(ICON)
+
 
 @config(f"{module.identifier}.source.bing")
 class BingConfig(BaseConfig): ...
@@ -23,7 +26,9 @@ class BingConfig(BaseConfig): ...
 
 @global_collect
 @impl_engine(engine="bing")
-def bing_image(engine: str | None, file: Path) -> ImageSearch | None:
+def bing_image(
+    engine: str | None, file: Path, url: str | None = None
+) -> ImageSearch | None:
     cfg: BingConfig = create(BingConfig, flush=True)
     if not cfg.enabled:
         return None
@@ -8,6 +8,7 @@ from PicImageSearch import Copyseeker
 from mephisto.library.model.metadata import ModuleMetadata
 
 from ..base import ImageSearch
+from ..favicon import register_favicon
 from ..utils import general_image_search, impl_engine
 from .base import BaseConfig
 
@@ -16,6 +17,8 @@ module = ModuleMetadata.current()
 NAME: Final[str] = "Copyseeker"
 ICON: Final[str] = "https://www.google.com/s2/favicons?domain=copyseeker.net"
 
+register_favicon(ICON)
+
 
 @config(f"{module.identifier}.source.copyseeker")
 class CopyseekerConfig(BaseConfig):
@@ -24,7 +27,9 @@ class CopyseekerConfig(BaseConfig):
 
 @global_collect
 @impl_engine(engine="copyseeker")
-def copyseeker_image(engine: str | None, file: Path) -> ImageSearch | None:
+def copyseeker_image(
+    engine: str | None, file: Path, url: str | None = None
+) -> ImageSearch | None:
     cfg: CopyseekerConfig = create(CopyseekerConfig, flush=True)
     if not cfg.enabled:
         return None
@@ -8,6 +8,7 @@ from PicImageSearch import EHentai
 from mephisto.library.model.metadata import ModuleMetadata
 
 from ..base import ImageSearch
+from ..favicon import register_favicon
 from ..utils import general_image_search, impl_engine
 from .base import BaseConfig
 
@@ -16,6 +17,8 @@ module = ModuleMetadata.current()
 NAME: Final[str] = "E-Hentai"
 ICON: Final[str] = "https://www.google.com/s2/favicons?domain=e-hentai.org"
 
+register_favicon(ICON)
+
 
 @config(f"{module.identifier}.source.ehentai")
 class EHentaiConfig(BaseConfig):
@@ -42,7 +45,9 @@ async def run_engine(instance: ImageSearch, engine: EHentai, file: Path):
 
 @global_collect
 @impl_engine(engine="ehentai")
-def e_hentai_image(engine: str | None, file: Path) -> ImageSearch | None:
+def e_hentai_image(
+    engine: str | None, file: Path, url: str | None = None
+) -> ImageSearch | None:
     cfg: EHentaiConfig = create(EHentaiConfig, flush=True)
     if not cfg.enabled:
         return None
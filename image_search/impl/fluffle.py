@@ -8,11 +8,11 @@ from graia.saya import Saya
 from kayaku import config, create
 from loguru import logger
 
-from mephisto.library.util.storage import TemporaryFile
 from mephisto.library.model.metadata import ModuleMetadata
 
 from ..base import ImageSearch, ImageSearchResultItem
-from ..utils import calculate_image_similarity, impl_engine
+from ..favicon import register_favicon
+from ..utils import fetch_thumbnail, impl_engine
 from .base import BaseConfig
 
 saya = Saya.current()
@@ -21,6 +21,8 @@ module = ModuleMetadata.current()
 NAME: Final[str] = "Fluffle"
 ICON: Final[str] = "https://www.google.com/s2/favicons?domain=fluffle.xyz"
 
+register_favicon(ICON)
+
 run_search = saya.access(f"module.fluffle.run_search")
 
 if TYPE_CHECKING:
@@ -42,19 +44,20 @@ async def run_fluffle(instance: ImageSearch, file: Path):
         logger.success("[ImageSearch] [Fluffle] Completed search for image")
         cfg: FluffleConfig = create(FluffleConfig)
         async with httpx.AsyncClient() as client:
+
+            async def download(location: str) -> bytes:
+                return (await client.get(location)).content
+
             for result in response["results"]:
                 if cfg.exact_match and result["match"] != "exact":
                     continue
                 with suppress(Exception):
                     url = result["location"]
-                    thumbnail = (
-                        await client.get(result["thumbnail"]["location"])
-                    ).content
-                    thumbnail_file = TemporaryFile.from_bytes(thumbnail)
+                    digest, thumbnail_file, similarity = await fetch_thumbnail(
+                        result["thumbnail"]["location"], download, image
+                    )
                     if result["match"] == "exact":
                         similarity = result["score"]
-                    else:
-                        similarity = calculate_image_similarity(thumbnail, image)
                     instance.results.append(
                         ImageSearchResultItem(
                             url=url,
@@ -66,13 +69,17 @@ async def run_fluffle(instance: ImageSearch, file: Path):
                             mark="check" if result["match"] == "exact" else "question",
                             favicon=None,
                             text_checkmark=False,
+                            thumbnail=digest,
                         )
                     )
+                    instance.temporary_files.append(thumbnail_file)
 
 
 @global_collect
 @impl_engine(engine="fluffle")
-def fluffle_image(engine: str | None, file: Path) -> ImageSearch | None:
+def fluffle_image(
+    engine: str | None, file: Path, url: str | None = None
+) -> ImageSearch | None:
     cfg: FluffleConfig = create(FluffleConfig, flush=True)
     if not cfg.enabled:
         return None
@@ -8,6 +8,7 @@ from PicImageSearch import Google
 from mephisto.library.model.metadata import ModuleMetadata
 
 from ..base import ImageSearch
+from ..favicon import register_favicon
 from ..utils import general_image_search, impl_engine
 from .base import BaseConfig
 
@@ -16,13 +17,17 @@ module = ModuleMetadata.current()
 NAME: Final[str] = "Google"
 ICON: Final[str] = "https://www.google.com/s2/favicons?domain=google.com"
 
+register_favicon(ICON)
+
 
 @config(f"{module.identifier}.source.google")
 class GoogleConfig(BaseConfig):
     base_url: str = "https://www.google.com"
 
 
-async def run_engine(instance: ImageSearch, engine: Google, file: Path):
+async def run_engine(
+    instance: ImageSearch, engine: Google, file: Path, url: str | None = None
+):
     cfg: GoogleConfig = create(GoogleConfig)
     await general_image_search(
         instance=instance,
@@ -31,6 +36,7 @@ async def run_engine(instance: ImageSearch, engine: Google, file: Path):
         icon=ICON,
         file=file,
         max_page=cfg.max_page,
+        url=url,
     )
     for result in instance.results:
         result["mark"] = "check"  # type: ignore
@@ -38,10 +44,12 @@ async def run_engine(instance: ImageSearch, engine: Google, file: Path):
 
 @global_collect
 @impl_engine(engine="google")
-def google_image(engine: str | None, file: Path) -> ImageSearch | None:
+def google_image(
+    engine: str | None, file: Path, url: str | None = None
+) -> ImageSearch | None:
     cfg: GoogleConfig = create(GoogleConfig, flush=True)
     if not cfg.enabled:
         return None
     instance = ImageSearch()
     engine = Google(base_url=cfg.base_url)
-    return instance.set_coroutine(run_engine(instance, engine, file))
+    return instance.set_coroutine(run_engine(instance, engine, file, url))
@@ -8,6 +8,7 @@ from PicImageSearch import Iqdb
 from mephisto.library.model.metadata import ModuleMetadata
 
 from ..base import ImageSearch
+from ..favicon import register_favicon
 from ..utils import general_image_search, impl_engine
 from .base import BaseConfig
 
@@ -16,6 +17,8 @@ module = ModuleMetadata.current()
 NAME: Final[str] = "IQDB"
 ICON: Final[str] = "https://www.google.com/s2/favicons?domain=iqdb.org"
 
+register_favicon(ICON)
+
 
 @config(f"{module.identifier}.source.iqdb")
 class IqdbConfig(BaseConfig):
@@ -24,7 +27,9 @@ class IqdbConfig(BaseConfig):
 
 @global_collect
 @impl_engine(engine="iqdb")
-def iqdb_image(engine: str | None, file: Path) -> ImageSearch | None:
+def iqdb_image(
+    engine: str | None, file: Path, url: str | None = None
+) -> ImageSearch | None:
     cfg: IqdbConfig = create(IqdbConfig, flush=True)
     if not cfg.enabled:
         return None
@@ -37,5 +42,6 @@ def iqdb_image(engine: str | None, file: Path) -> ImageSearch | None:
             icon=ICON,
             file=file,
             max_page=cfg.max_page,
+            url=url,
         )
     )
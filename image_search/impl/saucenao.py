@@ -8,6 +8,7 @@ from PicImageSearch import SauceNAO
 from mephisto.library.model.metadata import ModuleMetadata
 
 from ..base import ImageSearch
+from ..favicon import register_favicon
 from ..utils import general_image_search, impl_engine
 from .base import BaseConfig
 
@@ -16,6 +17,8 @@ module = ModuleMetadata.current()
 NAME: Final[str] = "SauceNAO"
 ICON: Final[str] = "https://www.google.com/s2/favicons?domain=saucenao.com"
 
+register_favicon(ICON)
+
 
 @config(f"{module.identifier}.source.saucenao")
 class SauceNAOConfig(BaseConfig):
@@ -26,7 +29,9 @@ class SauceNAOConfig(BaseConfig):
 
 @global_collect
 @impl_engine(engine="saucenao")
-def saucenao_image(engine: str | None, file: Path) -> ImageSearch | None:
+def saucenao_image(
+    engine: str | None, file: Path, url: str | None = None
+) -> ImageSearch | None:
     cfg: SauceNAOConfig = create(SauceNAOConfig, flush=True)
     if not cfg.enabled:
         return None
@@ -39,5 +44,6 @@ def saucenao_image(engine: str | None, file: Path) -> ImageSearch | None:
             icon=ICON,
             file=file,
             max_page=cfg.max_page,
+            url=url,
         )
     )
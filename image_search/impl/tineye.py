@@ -8,6 +8,7 @@ from PicImageSearch import Tineye
 from mephisto.library.model.metadata import ModuleMetadata
 
 from ..base import ImageSearch
+from ..favicon import register_favicon
 from ..utils import general_image_search, impl_engine
 from .base import BaseConfig
 
@@ -16,6 +17,8 @@ module = ModuleMetadata.current()
 NAME: Final[str] = "TinEye"
 ICON: Final[str] = "https://www.google.com/s2/favicons?domain=tineye.com"
 
+register_favicon(ICON)
+
 
 @config(f"{module.identifier}.source.tineye")
 class TinEyeConfig(BaseConfig):
@@ -24,7 +27,9 @@ class TinEyeConfig(BaseConfig):
 
 @global_collect
 @impl_engine(engine="tineye")
-def tineye_image(engine: str | None, file: Path) -> ImageSearch | None:
+def tineye_image(
+    engine: str | None, file: Path, url: str | None = None
+) -> ImageSearch | None:
     cfg: TinEyeConfig = create(TinEyeConfig, flush=True)
     if not cfg.enabled:
         return None
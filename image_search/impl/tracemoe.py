@@ -8,6 +8,7 @@ from PicImageSearch import TraceMoe
 from mephisto.library.model.metadata import ModuleMetadata
 
 from ..base import ImageSearch
+from ..favicon import register_favicon
 from ..utils import general_image_search, impl_engine
 from .base import BaseConfig
 
@@ -16,6 +17,8 @@ module = ModuleMetadata.current()
 NAME: Final[str] = "TraceMoe"
 ICON: Final[str] = "https://www.google.com/s2/favicons?domain=trace.moe"
 
+register_favicon(ICON)
+
 
 @config(f"{module.identifier}.source.tracemoe")
 class TraceMoeConfig(BaseConfig):
@@ -27,7 +30,9 @@ class TraceMoeConfig(BaseConfig):
 
 @global_collect
 @impl_engine(engine="tracemoe")
-def tracemoe_image(engine: str | None, file: Path) -> ImageSearch | None:
+def tracemoe_image(
+    engine: str | None, file: Path, url: str | None = None
+) -> ImageSearch | None:
     cfg: TraceMoeConfig = create(TraceMoeConfig, flush=True)
     if not cfg.enabled:
         return None
@@ -45,5 +50,6 @@ def tracemoe_image(engine: str | None, file: Path) -> ImageSearch | None:
             icon=ICON,
             file=file,
             max_page=cfg.max_page,
+            url=url,
         )
     )
@@ -8,6 +8,7 @@ from PicImageSearch import Yandex
 from mephisto.library.model.metadata import ModuleMetadata
 
 from ..base import ImageSearch
+from ..favicon import register_favicon
 from ..utils import general_image_search, impl_engine
 from .base import BaseConfig
 
@@ -16,6 +17,8 @@ module = ModuleMetadata.current()
 NAME: Final[str] = "Yandex"
 ICON: Final[str] = "https://www.google.com/s2/favicons?domain=yandex.com"
 
+register_favicon(ICON)
+
 
 @config(f"{module.identifier}.source.yandex")
 class YandexConfig(BaseConfig):
@@ -24,7 +27,9 @@ class YandexConfig(BaseConfig):
 
 @global_collect
 @impl_engine(engine="yandex")
-def yandex_image(engine: str | None, file: Path) -> ImageSearch | None:
+def yandex_image(
+    engine: str | None, file: Path, url: str | None = None
+) -> ImageSearch | None:
     cfg: YandexConfig = create(YandexConfig, flush=True)
     if not cfg.enabled:
         return None
@@ -37,5 +42,6 @@ def yandex_image(engine: str | None, file: Path) -> ImageSearch | None:
             icon=ICON,
             file=file,
             max_page=cfg.max_page,
+            url=url,
         )
     )
@@ -0,0 +1,41 @@
+import asyncio
+
+from loguru import logger
+
+_searches: dict[str, asyncio.Task] = {}
+_targets: dict[tuple[str, str], str] = {}
+_indicators: dict[str, str] = {}
+
+
+def track_search(command: str, user: str, target: str, task: asyncio.Task):
+    if (previous := _targets.get((user, target))) is not None:
+        if cancel_search(previous):
+            logger.info(f"[ImageSearch] Search {previous} superseded by {command}")
+    _searches[command] = task
+    _targets[(user, target)] = command
+
+    def _discard(_):
+        if _searches.get(command) is task:
+            del _searches[command]
+        if _targets.get((user, target)) == command:
+            del _targets[(user, target)]
+        for indicator in [k for k, v in _indicators.items() if v == command]:
+            del _indicators[indicator]
+
+    task.add_done_callback(_discard)
+
+
+def track_indicator(command: str, indicator: str):
+    if command in _searches:
+        _indicators[indicator] = command
+
+
+def untrack_indicator(indicator: str):
+    _indicators.pop(indicator, None)
+
+
+def cancel_search(message: str) -> bool:
+    command = _indicators.get(message, message)
+    if (task := _searches.get(command)) is None or task.done():
+        return False
+    return task.cancel()
@@ -0,0 +1,103 @@
+import math
+from collections import OrderedDict
+from hashlib import blake2b
+
+from creart import it
+from kayaku import config, create
+from launart import Launart
+from loguru import logger
+from sqlalchemy import select
+
+from mephisto.library.model.metadata import ModuleMetadata
+from mephisto.library.service import DataService
+
+from .table import ImageSearchResultTable
+
+module = ModuleMetadata.current()
+
+
+@config(f"{module.identifier}.lookup")
+class LookupConfig:
+    capacity: int = 100_000
+    error_rate: float = 0.001
+    cache_size: int = 256
+
+
+class BloomFilter:
+    size: int
+    hash_count: int
+    bits: bytearray
+
+    def __init__(self, capacity: int, error_rate: float):
+        capacity = max(capacity, 1)
+        self.size = max(
+            math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2), 8
+        )
+        self.hash_count = max(round(self.size / capacity * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (first + i * second) % self.size
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+
+class ResultIndex:
+    ready: bool
+    messages: BloomFilter
+    results: OrderedDict[str, dict[int, str]]
+
+    def __init__(self):
+        self.ready = False
+        self.messages = BloomFilter(1, 0.5)
+        self.results = OrderedDict()
+
+    async def rebuild(self):
+        cfg: LookupConfig = create(LookupConfig, flush=True)
+        main_engine = (
+            await it(Launart).get_component(DataService).registry.create("main")
+        )
+        rows = (
+            await main_engine.execute(
+                select(ImageSearchResultTable.message_id).distinct()
+            )
+        ).fetchall()
+        messages = BloomFilter(max(cfg.capacity, len(rows) * 2), cfg.error_rate)
+        for row in rows:
+            messages.add(str(row[0]))
+        for message_id in self.results:
+            messages.add(message_id)
+        self.messages = messages
+        self.ready = True
+        logger.success(f"[ImageSearch] Indexed {len(rows)} search card(s)")
+
+    def might_contain(self, message_id: str) -> bool:
+        return not self.ready or message_id in self.messages
+
+    def register(self, message_id: str, results: dict[int, str]):
+        cfg: LookupConfig = create(LookupConfig)
+        self.messages.add(message_id)
+        self.results[message_id] = results
+        self.results.move_to_end(message_id)
+        while len(self.results) > cfg.cache_size:
+            self.results.popitem(last=False)
+
+    def get(self, message_id: str) -> dict[int, str] | None:
+        if (results := self.results.get(message_id)) is not None:
+            self.results.move_to_end(message_id)
+        return results
+
+
+result_index = ResultIndex()
@@ -1,11 +1,25 @@
 import asyncio
+import json
 from contextlib import suppress
-from datetime import datetime
+from datetime import datetime, timedelta
+from time import time
 from typing import TYPE_CHECKING
 
-from avilla.core import Context, Message, Notice, Picture, RawResource
+from avilla.core import (
+    Avilla,
+    Context,
+    Message,
+    Notice,
+    Picture,
+    RawResource,
+    Selector,
+)
 from avilla.standard.core.application import ApplicationReady
-from avilla.standard.core.message import MessageReceived, MessageRevoke
+from avilla.standard.core.message import (
+    MessageReceived,
+    MessageRevoke,
+    MessageRevoked,
+)
 from avilla.twilight.twilight import (
     ArgResult,
     ArgumentMatch,
@@ -22,6 +36,7 @@ from graia.saya.builtins.broadcast.shortcut import dispatch, listen
 from kayaku import config, create
 from launart import Launart
 from loguru import logger
+from sqlalchemy import delete
 from yarl import URL
 
 from mephisto.library.model.exception import MessageRecordNotFound
@@ -29,8 +44,27 @@ from mephisto.library.model.metadata import ModuleMetadata
 from mephisto.library.service import DataService
 from mephisto.library.util.storage import TemporaryFile
 
-from .table import ImageSearchResultTable
-from .utils import _all_engines, get_reply_image, run_image_search
+from .base import ImageSearch
+from .favicon import preload_favicons
+from .inflight import (
+    cancel_search,
+    track_indicator,
+    track_search,
+    untrack_indicator,
+)
+from .lookup import result_index
+from .prewarm import busy, prewarm, wait_prewarm
+from .reuse import RecentCard, ReuseConfig, card_key, find_card, remember_card
+from .scheduler import QueueFull, scheduler
+from .table import ImageSearchResultTable, ImageSearchSnapshotTable
+from .thumbnail import ThumbnailConfig, purge_thumbnails
+from .utils import (
+    _all_engines,
+    coalesce_thumbnails,
+    get_reply_picture,
+    resolve_search_url,
+    run_image_search,
+)
 from .whitelist import whitelisted
 
 saya = Saya.current()
@@ -95,7 +129,130 @@ async def init():
     logger.info("[ImageSearch] Initializing database")
     main_engine = await it(Launart).get_component(DataService).registry.create("main")
     await main_engine.create(ImageSearchResultTable)
+    await main_engine.create(ImageSearchSnapshotTable)
     logger.success("[ImageSearch] Initialized database")
+    await result_index.rebuild()
+    asyncio.create_task(preload_favicons())
+    asyncio.create_task(run_retention())
+
+
+async def purge_snapshots():
+    cfg: ThumbnailConfig = create(ThumbnailConfig, flush=True)
+    main_engine = await it(Launart).get_component(DataService).registry.create("main")
+    await main_engine.execute(
+        delete(ImageSearchSnapshotTable).where(
+            ImageSearchSnapshotTable.time
+            < datetime.now() - timedelta(days=cfg.retention_days)
+        )
+    )
+    logger.success("[ImageSearch] Purged expired search snapshots")
+
+
+async def run_retention():
+    while True:
+        try:
+            await asyncio.to_thread(purge_thumbnails)
+            await purge_snapshots()
+        except Exception as e:
+            logger.error(f"[ImageSearch] Failed to purge expired data: {e}")
+        cfg: ThumbnailConfig = create(ThumbnailConfig, flush=True)
+        await asyncio.sleep(max(cfg.purge_interval, 60))
+
+
+async def register_card(message_id: str, merged: ImageSearch, start_time: datetime):
+    main_engine = await it(Launart).get_component(DataService).registry.create("main")
+    for index, result in enumerate(merged.results):
+        await main_engine.insert(
+            ImageSearchResultTable,
+            message_id=message_id,
+            index=merged.offset + index + 1,
+            url=result["url"],
+            text=result["text"],
+            thumbnail=result["image"],
+            similarity=result["similarity"],
+            engine=result["engine"],
+        )
+    await main_engine.insert(
+        ImageSearchSnapshotTable,
+        message_id=message_id,
+        time=start_time,
+        similarity=merged.min_similarity,
+        count=merged.max_count,
+        page=merged.page,
+        data=json.dumps(merged.dump(), ensure_ascii=False),
+    )
+    result_index.register(
+        message_id,
+        {
+            merged.offset + index + 1: result["url"]
+            for index, result in enumerate(merged.results)
+        },
+    )
+
+
+async def send_card(
+    ctx: Context, merged: ImageSearch, start_time: datetime
+) -> tuple[Selector, bytes]:
+    image = await merged.render(start_time)
+    receipt = await ctx.scene.send_message(MessageChain([Picture(RawResource(image))]))
+    await register_card(receipt.to_selector().display, merged, start_time)
+    prewarm(merged.results)
+    return receipt.to_selector(), image
+
+
+async def reuse_card(ctx: Context, event: Message, card: RecentCard):
+    cfg: ReuseConfig = create(ReuseConfig)
+    logger.info(f"[ImageSearch] Reusing search card: {card.message.display}")
+    if not cfg.resend:
+        return await ctx.scene.send_message(
+            MessageChain("[ImageSearch] 该图片刚刚已被搜索过，请查看此消息"),
+            reply=card.message,
+        )
+    receipt = await ctx.scene.send_message(
+        MessageChain([Picture(RawResource(card.image))]), reply=event
+    )
+    await register_card(receipt.to_selector().display, card.merged, card.start_time)
+
+
+async def page_card(
+    ctx: Context,
+    event: Message,
+    snapshot: dict,
+    similarity: ArgResult,
+    count: ArgResult,
+    page: ArgResult,
+):
+    _similarity = similarity.result if similarity.matched else snapshot["similarity"]
+    _count = count.result if count.matched else snapshot["count"]
+    if page.matched:
+        _page = max(int(page.result), 1)
+    elif similarity.matched or count.matched:
+        _page = 1
+    else:
+        _page = snapshot["page"] + 1
+    merged = ImageSearch.load(json.loads(snapshot["data"])).filter(
+        min_similarity=_similarity, max_count=_count, page=_page
+    )
+    if not merged.results:
+        return await ctx.scene.send_message(
+            MessageChain("[ImageSearch] 没有更多结果了"), reply=event
+        )
+    try:
+        ticket = scheduler.enqueue(
+            ctx.scene.to_selector().display, ctx.client.to_selector().display
+        )
+    except QueueFull:
+        return await ctx.scene.send_message(
+            "[ImageSearch] 当前搜索请求过多，请稍后再试", reply=event
+        )
+    async with scheduler.acquire(ticket):
+        with busy():
+            try:
+                await send_card(ctx, merged, snapshot["time"])
+            except Exception as e:
+                await ctx.scene.send_message(
+                    MessageChain(f"[ImageSearch] 未能生成图片: {e}")
+                )
 
 
 @listen(MessageReceived)
@@ -104,9 +261,11 @@ async def init():
         ElementMatch(Notice, optional=True),
         ElementMatch(Notice, optional=True),
         UnionMatch("/search", "/s"),
+        UnionMatch("more", "更多", optional=True),
         ArgumentMatch("-s", "--similarity", type=float, optional=True) @ "similarity",
         ArgumentMatch("-e", "--engine", type=str, optional=True) @ "engine",
         ArgumentMatch("-c", "--count", type=int, optional=True) @ "count",
+        ArgumentMatch("-p", "--page", type=int, optional=True) @ "page",
     )
 )
 async def image_search(
@@ -115,6 +274,7 @@ async def image_search(
     similarity: ArgResult,
     engine: ArgResult,
     count: ArgResult,
+    page: ArgResult,
 ):
     if not event.reply:
         return await ctx.scene.send_message(
@@ -124,75 +284,155 @@ async def image_search(
         return await ctx.scene.send_message(
             "[ImageSearch] 未授权的场景或用户", reply=event
         )
+    async with (
+        await it(Launart).get_component(DataService).registry.create("main")
+    ).scalar(
+        ImageSearchSnapshotTable,
+        ImageSearchSnapshotTable.message_id == event.reply.to_selector().display,
+    ) as snapshot:
+        if snapshot:
+            snapshot = {
+                "time": snapshot.time,
+                "similarity": snapshot.similarity,
+                "count": snapshot.count,
+                "page": snapshot.page,
+                "data": snapshot.data,
+            }
+    if snapshot:
+        return await page_card(ctx, event, snapshot, similarity, count, page)
     try:
         cfg: ImageSearchConfig = create(ImageSearchConfig, flush=True)
         _similarity = (
             similarity.result if similarity.matched else cfg.default_similarity
         )
-        _engine = engine.result if engine.matched else cfg.default_engine
         _count = count.result if count.matched else cfg.default_count
         _engine = str(engine.result).lower() if engine.matched else cfg.default_engine
+        _page = max(page.result, 1) if page.matched else 1
         start_time = datetime.now()
-        with TemporaryFile.from_bytes(
-            await get_reply_image(event.reply, ctx.scene.to_selector())
-        ) as file:
+        picture = await get_reply_picture(event.reply, ctx.scene.to_selector())
+        image = await Avilla.current().fetch_resource(picture.resource)
+    except MessageRecordNotFound:
+        return await ctx.scene.send_message("[ImageSearch] 暂未储存该消息", reply=event)
+    except IndexError:
+        return await ctx.scene.send_message(
+            "[ImageSearch] 消息中未包含图片", reply=event
+        )
 
-            logger.info("[ImageSearch] Searching for image")
-            indicator = await ctx.scene.send_message(
-                "[ImageSearch] 正在搜索图片", reply=event
-            )
+    key = card_key(image, _similarity, _engine, _count, _page)
+    if (card := find_card(ctx.scene.to_selector().display, key)) is not None:
+        return await reuse_card(ctx, event, card)
 
-            engines = run_image_search(
-                file, engine=None if _engine == "all" else _engine
-            )
-            await asyncio.gather(
-                *[engine.run() for engine in engines if engine is not None]
-            )
-            logger.success(f"[ImageSearch] Completed search for image")
+    task = asyncio.create_task(
+        run_search(
+            ctx,
+            event,
+            picture,
+            image,
+            key=key,
+            similarity=_similarity,
+            engine=_engine,
+            count=_count,
+            page=_page,
+            start_time=start_time,
+        )
+    )
+    track_search(
+        event.to_selector().display,
+        ctx.client.to_selector().display,
+        event.reply.to_selector().display,
+        task,
+    )
+    await asyncio.wait({task})
+    if task.cancelled():
+        logger.info("[ImageSearch] Search cancelled")
+        return
+    task.result()
 
-            try:
-                merged = engines.pop().merge(
-                    engines, min_similarity=_similarity, max_count=_count
+
+async def run_search(
+    ctx: Context,
+    event: Message,
+    picture: Picture,
+    image: bytes,
+    *,
+    key: tuple,
+    similarity: float,
+    engine: str,
+    count: int,
+    page: int,
+    start_time: datetime,
+):
+    try:
+        ticket = scheduler.enqueue(
+            ctx.scene.to_selector().display, ctx.client.to_selector().display
+        )
+    except QueueFull:
+        return await ctx.scene.send_message(
+            "[ImageSearch] 当前搜索请求过多，请稍后再试", reply=event
+        )
+    indicator = None
+    try:
+        logger.info("[ImageSearch] Searching for image")
+        try:
+            indicator = await ctx.scene.send_message(
+                (
+                    f"[ImageSearch] 正在搜索图片（排队中，第 {position} 位）"
+                    if (position := scheduler.position(ticket))
+                    else "[ImageSearch] 正在搜索图片"
+                ),
+                reply=event,
+            )
+        except BaseException:
+            scheduler.cancel(ticket)
+            raise
+        track_indicator(event.to_selector().display, indicator.to_selector().display)
+        async with scheduler.acquire(ticket):
+            with (
+                busy(),
+                coalesce_thumbnails(),
+                TemporaryFile.from_bytes(image) as file,
+            ):
+                engines = run_image_search(
+                    file,
+                    engine=None if engine == "all" else engine,
+                    url=await resolve_search_url(picture, image),
                 )
-                if merged.results:
-                    receipt = await ctx.scene.send_message(
-                        MessageChain(
-                            [Picture(RawResource(await merged.render(start_time)))]
-                        )
-                    )
+                await asyncio.gather(
+                    *[instance.run() for instance in engines if instance is not None]
+                )
+                logger.success(f"[ImageSearch] Completed search for image")
 
-                    for index, result in enumerate(merged.results):
-                        await (
-                            await it(Launart)
-                            .get_component(DataService)
-                            .registry.create("main")
-                        ).insert(
-                            ImageSearchResultTable,
-                            message_id=receipt.to_selector().display,
-                            index=index + 1,
-                            url=result["url"],
-                            text=result["text"],
-                            thumbnail=result["image"],
-                            similarity=result["similarity"],
-                            engine=result["engine"],
+                try:
+                    merged = engines.pop().merge(
+                        engines, min_similarity=similarity, max_count=count, page=page
+                    )
+                    if merged.results:
+                        message, rendered = await send_card(ctx, merged, start_time)
+                        remember_card(
+                            ctx.scene.to_selector().display,
+                            key,
+                            RecentCard(message, rendered, merged, start_time, time()),
                         )
-                else:
+                    else:
+                        await ctx.scene.send_message(
+                            MessageChain("[ImageSearch] 未能找到相关图片"),
+                            reply=event,
+                        )
+                except Exception as e:
                     await ctx.scene.send_message(
-                        MessageChain("[ImageSearch] 未能找到相关图片"),
-                        reply=event,
+                        MessageChain(f"[ImageSearch] 未能生成图片: {e}")
                     )
-            except Exception as e:
-                await ctx.scene.send_message(
-                    MessageChain(f"[ImageSearch] 未能生成图片: {e}")
-                )
+    finally:
+        if indicator is not None:
+            untrack_indicator(indicator.to_selector().display)
             with suppress(Exception):
                 await ctx.staff.call_fn(MessageRevoke.revoke, indicator.to_selector())
-    except MessageRecordNotFound:
-        return await ctx.scene.send_message("[ImageSearch] 暂未储存该消息", reply=event)
-    except IndexError:
-        return await ctx.scene.send_message(
-            "[ImageSearch] 消息中未包含图片", reply=event
-        )
+
+
+@listen(MessageRevoked)
+async def cancel_revoked_search(event: MessageRevoked):
+    if cancel_search(event.message.display):
+        logger.info(f"[ImageSearch] Cancelling revoked search: {event.message.display}")
 
 
 @listen(MessageReceived)
@@ -210,32 +450,41 @@ async def fetch_result(
 ):
     if not event.reply or not index.matched:
         return
-    async with (
-        await it(Launart).get_component(DataService).registry.create("main")
-    ).scalar(
-        ImageSearchResultTable,
-        ImageSearchResultTable.message_id == event.reply.to_selector().display,
-        ImageSearchResultTable.index == str(index.result.lstrip("#").strip()),
-    ) as result:
-        if not result:
-            logger.warning("[ImageSearch] Result not found")
-            return
-        if not whitelisted(ctx.scene.to_selector(), ctx.client.to_selector()):
-            return await ctx.scene.send_message(
-                "[ImageSearch] 未授权的场景或用户", reply=event
-            )
-        if no_preview.matched or not lp_whitelisted(
-            ctx.scene.to_selector(), ctx.client.to_selector()
-        ):
-            return await ctx.scene.send_message(result.url, reply=event)
-        url = URL(result.url)
+    message_id = event.reply.to_selector().display
+    if not result_index.might_contain(message_id):
+        return
+    _index = int(str(index.result).lstrip("#").strip())
+    if (results := result_index.get(message_id)) is not None:
+        url = results.get(_index)
+    else:
+        async with (
+            await it(Launart).get_component(DataService).registry.create("main")
+        ).scalar(
+            ImageSearchResultTable,
+            ImageSearchResultTable.message_id == message_id,
+            ImageSearchResultTable.index == str(_index),
+        ) as result:
+            url = result.url if result else None
+    if not url:
+        logger.warning("[ImageSearch] Result not found")
+        return
+    if not whitelisted(ctx.scene.to_selector(), ctx.client.to_selector()):
+        return await ctx.scene.send_message(
+            "[ImageSearch] 未授权的场景或用户", reply=event
+        )
+    if no_preview.matched or not lp_whitelisted(
+        ctx.scene.to_selector(), ctx.client.to_selector()
+    ):
+        return await ctx.scene.send_message(url, reply=event)
+    url = URL(url)
     try:
         if not can_preview(url):
             return await ctx.scene.send_message(str(url), reply=event)
-        preview = preview_link(url)
         indicator = await ctx.scene.send_message(
             "[ImageSearch] 正在生成预览", reply=event
         )
+        await wait_prewarm(str(url))
+        preview = preview_link(url)
         await preview.run()
         await ctx.scene.send_message(
             MessageChain([Picture(RawResource(await preview.render()))])
@@ -0,0 +1,107 @@
+import asyncio
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+
+from graia.saya import Saya
+from kayaku import config, create
+from loguru import logger
+from yarl import URL
+
+from mephisto.library.model.metadata import ModuleMetadata
+
+from .base import ImageSearchResultItem
+
+saya = Saya.current()
+module = ModuleMetadata.current()
+
+can_preview = saya.access(f"module.link_preview.can_preview")
+preview_link = saya.access(f"module.link_preview.preview_link")
+
+if TYPE_CHECKING:
+    from mephisto.module.link_preview.utils import can_preview, preview_link
+
+
+@config(f"{module.identifier}.prewarm")
+class PrewarmConfig:
+    enabled: bool = True
+    count: int = 3
+    concurrency: int = 1
+    idle_interval: float = 1.0
+    max_wait: float = 60.0
+    max_queued: int = 16
+
+
+_tasks: dict[str, asyncio.Task] = {}
+_active: set[str] = set()
+_semaphore: tuple[int, asyncio.Semaphore] | None = None
+_busy: int = 0
+
+
+def _get_semaphore(concurrency: int) -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None or _semaphore[0] != concurrency:
+        _semaphore = (concurrency, asyncio.Semaphore(max(concurrency, 1)))
+    return _semaphore[1]
+
+
+@contextmanager
+def busy():
+    global _busy
+    _busy += 1
+    try:
+        yield
+    finally:
+        _busy -= 1
+
+
+async def _prewarm(url: str, cfg: PrewarmConfig):
+    deadline = asyncio.get_running_loop().time() + cfg.max_wait
+    while _busy:
+        if asyncio.get_running_loop().time() > deadline:
+            logger.debug(f"[ImageSearch] Dropping queued prewarm: {url}")
+            return
+        await asyncio.sleep(cfg.idle_interval)
+    async with _get_semaphore(cfg.concurrency):
+        logger.debug(f"[ImageSearch] Prewarming preview: {url}")
+        _active.add(url)
+        try:
+            preview = preview_link(URL(url))
+            await preview.run()
+            if preview._exceptions:
+                raise preview._exceptions[0]
+        except Exception as e:
+            logger.debug(f"[ImageSearch] Failed to prewarm preview {url}: {e}")
+            return
+        finally:
+            _active.discard(url)
+        logger.debug(f"[ImageSearch] Prewarmed preview: {url}")
+
+
+def _discard(url: str, task: asyncio.Task):
+    if _tasks.get(url) is task:
+        del _tasks[url]
+
+
+def prewarm(results: list[ImageSearchResultItem]):
+    cfg: PrewarmConfig = create(PrewarmConfig, flush=True)
+    if not cfg.enabled or cfg.count <= 0:
+        return
+    urls = [str(URL(result["url"])) for result in results if can_preview(result["url"])]
+    for url in urls[: cfg.count]:
+        if url in _tasks:
+            continue
+        if len(_tasks) >= max(cfg.max_queued, 1):
+            logger.debug(f"[ImageSearch] Prewarm queue full, skipping: {url}")
+            break
+        task = asyncio.create_task(_prewarm(url, cfg))
+        task.add_done_callback(lambda t, u=url: _discard(u, t))
+        _tasks[url] = task
+
+
+async def wait_prewarm(url: str):
+    if (task := _tasks.get(url)) is None:
+        return
+    if url in _active:
+        await asyncio.wait({task})
+    else:
+        task.cancel()
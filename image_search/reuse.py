@@ -0,0 +1,85 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from hashlib import sha256
+
+from avilla.core import Selector
+from kayaku import config, create
+
+from mephisto.library.model.metadata import ModuleMetadata
+
+from .base import ImageSearch
+
+module = ModuleMetadata.current()
+
+
+@config(f"{module.identifier}.reuse")
+class ReuseConfig:
+    enabled: bool = True
+    window: int = 300
+    resend: bool = False
+    max_cards: int = 16
+    max_total: int = 256
+    max_bytes: int = 32 * 1024 * 1024
+
+
+@dataclass
+class RecentCard:
+    message: Selector
+    image: bytes
+    merged: ImageSearch
+    start_time: datetime
+    created: float
+
+
+_recent: dict[str, OrderedDict[tuple, RecentCard]] = {}
+
+
+def card_key(
+    image: bytes, similarity: float, engine: str, count: int, page: int
+) -> tuple:
+    return sha256(image).hexdigest(), similarity, engine, count, page
+
+
+def _expire(scene: str, deadline: float):
+    cards = _recent[scene]
+    for expired in [k for k, card in cards.items() if card.created < deadline]:
+        del cards[expired]
+    if not cards:
+        del _recent[scene]
+
+
+def find_card(scene: str, key: tuple) -> RecentCard | None:
+    cfg: ReuseConfig = create(ReuseConfig, flush=True)
+    if not cfg.enabled or scene not in _recent:
+        return None
+    _expire(scene, time.time() - cfg.window)
+    return _recent.get(scene, {}).get(key)
+
+
+def remember_card(scene: str, key: tuple, card: RecentCard):
+    cfg: ReuseConfig = create(ReuseConfig)
+    if not cfg.enabled:
+        return
+    deadline = time.time() - cfg.window
+    for name in list(_recent):
+        _expire(name, deadline)
+    cards = _recent.setdefault(scene, OrderedDict())
+    cards[key] = card
+    cards.move_to_end(key)
+    while len(cards) > cfg.max_cards:
+        cards.popitem(last=False)
+    while _recent and (
+        sum(map(len, _recent.values())) > max(cfg.max_total, 1)
+        or sum(
+            len(item.image) for recent in _recent.values() for item in recent.values()
+        )
+        > cfg.max_bytes
+    ):
+        oldest = min(
+            _recent, key=lambda name: next(iter(_recent[name].values())).created
+        )
+        _recent[oldest].popitem(last=False)
+        if not _recent[oldest]:
+            del _recent[oldest]
@@ -0,0 +1,122 @@
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+
+from kayaku import config, create
+from loguru import logger
+
+from mephisto.library.model.metadata import ModuleMetadata
+
+module = ModuleMetadata.current()
+
+
+@config(f"{module.identifier}.scheduler")
+class SchedulerConfig:
+    concurrency: int = 2
+    max_queue: int = 20
+
+
+class QueueFull(Exception):
+    pass
+
+
+class SearchScheduler:
+    running: int
+    scenes: OrderedDict[str, OrderedDict[str, deque[asyncio.Future]]]
+
+    def __init__(self):
+        self.running = 0
+        self.scenes = OrderedDict()
+
+    def _order(self):
+        scenes = deque(
+            deque(
+                deque(ticket for ticket in tickets if not ticket.done())
+                for tickets in users.values()
+            )
+            for users in self.scenes.values()
+        )
+        while scenes:
+            users = scenes.popleft()
+            if not users:
+                continue
+            tickets = users.popleft()
+            if tickets:
+                yield tickets.popleft()
+            if tickets:
+                users.append(tickets)
+            if users:
+                scenes.append(users)
+
+    @property
+    def queued(self) -> int:
+        return sum(
+            not ticket.done()
+            for users in self.scenes.values()
+            for tickets in users.values()
+            for ticket in tickets
+        )
+
+    def position(self, ticket: asyncio.Future) -> int:
+        for index, queued in enumerate(self._order()):
+            if queued is ticket:
+                return index + 1
+        return 0
+
+    def enqueue(self, scene: str, user: str) -> asyncio.Future:
+        cfg: SchedulerConfig = create(SchedulerConfig, flush=True)
+        ticket = asyncio.get_running_loop().create_future()
+        if self.running < cfg.concurrency and not self.queued:
+            self.running += 1
+            ticket.set_result(None)
+            return ticket
+        if self.queued >= cfg.max_queue:
+            raise QueueFull
+        self.scenes.setdefault(scene, OrderedDict()).setdefault(user, deque())
+        self.scenes[scene][user].append(ticket)
+        logger.debug(f"[ImageSearch] Queued search from {user} in {scene}")
+        return ticket
+
+    def _dispatch(self):
+        cfg: SchedulerConfig = create(SchedulerConfig)
+        while self.running < cfg.concurrency and self.scenes:
+            scene, users = next(iter(self.scenes.items()))
+            user, tickets = next(iter(users.items()))
+            ticket = tickets.popleft()
+            if tickets:
+                users.move_to_end(user)
+            else:
+                del users[user]
+            if users:
+                self.scenes.move_to_end(scene)
+            else:
+                del self.scenes[scene]
+            if ticket.done():
+                continue
+            self.running += 1
+            ticket.set_result(None)
+
+    def release(self):
+        self.running -= 1
+        self._dispatch()
+
+    def cancel(self, ticket: asyncio.Future):
+        if ticket.done() and not ticket.cancelled():
+            self.release()
+        else:
+            ticket.cancel()
+
+    @asynccontextmanager
+    async def acquire(self, ticket: asyncio.Future):
+        try:
+            await ticket
+        except asyncio.CancelledError:
+            self.cancel(ticket)
+            raise
+        try:
+            yield
+        finally:
+            self.release()
+
+
+scheduler = SearchScheduler()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text
+from sqlalchemy import Column, DateTime, Float, Integer, String, Text
 
 from mephisto.library.util.orm.base import Base
 
@@ -15,3 +15,16 @@ class ImageSearchResultTable(Base):
     thumbnail = Column(Text())
     similarity = Column(Integer())
     engine = Column(Text())
+
+
+class ImageSearchSnapshotTable(Base):
+    __tablename__ = "image_search_snapshot"
+
+    id = Column(Integer(), primary_key=True)
+    message_id = Column(String(length=64))
+
+    time = Column(DateTime())
+    similarity = Column(Float())
+    count = Column(Integer())
+    page = Column(Integer())
+    data = Column(Text())
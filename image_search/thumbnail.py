@@ -0,0 +1,55 @@
+import os
+import time
+from hashlib import sha256
+
+from kayaku import config, create
+from loguru import logger
+
+from mephisto.library.model.metadata import ModuleMetadata
+from mephisto.library.util.storage import File, TemporaryFile
+
+module = ModuleMetadata.current()
+
+
+@config(f"{module.identifier}.thumbnail")
+class ThumbnailConfig:
+    retention_days: int = 7
+    coalesce_ttl: int = 60
+    purge_interval: int = 6 * 60 * 60
+
+
+def _thumbnail_file(digest: str) -> File:
+    return File(*module.identifier.split("."), "thumbnail", digest)
+
+
+def store_thumbnail(data: bytes) -> tuple[str, TemporaryFile]:
+    digest = sha256(data).hexdigest()
+    file = _thumbnail_file(digest)
+    if file.exists:
+        os.utime(file.path)
+    else:
+        file.write_bytes(data)
+    return digest, TemporaryFile.from_file(file.path)
+
+
+def load_thumbnail(digest: str) -> TemporaryFile | None:
+    if not digest:
+        return None
+    file = _thumbnail_file(digest)
+    if not file.exists:
+        return None
+    return TemporaryFile.from_file(file.path)
+
+
+def purge_thumbnails():
+    cfg: ThumbnailConfig = create(ThumbnailConfig, flush=True)
+    directory = File(*module.identifier.split("."), "thumbnail").path
+    if not directory.is_dir():
+        return
+    deadline = time.time() - cfg.retention_days * 24 * 60 * 60
+    purged = 0
+    for path in directory.iterdir():
+        if path.is_file() and path.stat().st_mtime < deadline:
+            path.unlink(missing_ok=True)
+            purged += 1
+    logger.success(f"[ImageSearch] Purged {purged} expired thumbnail(s)")
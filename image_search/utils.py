@@ -1,23 +1,70 @@
+import asyncio
 import base64
 import io
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from hashlib import sha256
 from pathlib import Path
+from threading import Lock
+from typing import Awaitable, Callable
 
+import aiohttp
 import cv2
 import numpy as np
-from avilla.core import Avilla, Picture, Selector
+from avilla.core import Picture, Selector
+from creart import it
 from flywheel import FnCollectEndpoint, SimpleOverload
+from kayaku import config, create
+from launart import Launart
 from loguru import logger
 from PicImageSearch.engines.base import BaseSearchEngine
 from PIL import Image
+from yarl import URL
 
-from mephisto.library.util.storage import TemporaryFile
 from mephisto.library.model.message import RebuiltMessage
+from mephisto.library.model.metadata import ModuleMetadata
+from mephisto.library.service import SessionService
+from mephisto.library.util.storage import TemporaryFile
 
 from .base import ImageSearch, ImageSearchResultItem
+from .thumbnail import ThumbnailConfig, store_thumbnail
+
+module = ModuleMetadata.current()
 
 ENGINE_OVERLOAD = SimpleOverload("engine")
 
+
+@config(f"{module.identifier}.search_url")
+class SearchUrlConfig:
+    enabled: bool = True
+    platform_url: bool = True
+    upload_url: str = ""
+    upload_field: str = "file"
+    response_key: str = "url"
+
+
+@config(f"{module.identifier}.similarity")
+class SimilarityConfig:
+    mode: str = "histogram"
+    prefilter: float = 0.2
+    max_features: int = 500
+    ratio: float = 0.75
+    max_side: int = 512
+    workers: int = 2
+    query_cache: int = 8
+
+
 _all_engines = []
+_scoring_pool: tuple[int, ThreadPoolExecutor] | None = None
+_query_features: OrderedDict[str, np.ndarray | None] = OrderedDict()
+_query_features_lock = Lock()
+_search_thumbnails: ContextVar[dict[str, asyncio.Task] | None] = ContextVar(
+    "_search_thumbnails", default=None
+)
+_global_thumbnails: dict[str, tuple[float, asyncio.Task]] = {}
 
 
 def calculate_image_similarity(image: bytes, base: bytes) -> float:
@@ -48,21 +95,94 @@ def calculate_image_similarity(image: bytes, base: bytes) -> float:
     return metric_val
 
 
+def _orb_descriptors(image: bytes, cfg: SimilarityConfig) -> np.ndarray | None:
+    pil_image = Image.open(io.BytesIO(image)).convert("L")
+    pil_image.thumbnail((cfg.max_side, cfg.max_side))
+    orb = cv2.ORB_create(nfeatures=cfg.max_features)
+    _, descriptors = orb.detectAndCompute(np.asarray(pil_image), None)
+    return descriptors
+
+
+def _query_descriptors(base: bytes, cfg: SimilarityConfig) -> np.ndarray | None:
+    digest = sha256(base).hexdigest()
+    with _query_features_lock:
+        if digest in _query_features:
+            _query_features.move_to_end(digest)
+            return _query_features[digest]
+        descriptors = _orb_descriptors(base, cfg)
+        _query_features[digest] = descriptors
+        while len(_query_features) > max(cfg.query_cache, 1):
+            _query_features.popitem(last=False)
+        return descriptors
+
+
+def calculate_feature_similarity(
+    image: bytes, base: bytes, cfg: SimilarityConfig
+) -> float:
+    if calculate_image_similarity(image, base) < cfg.prefilter:
+        return 0.0
+    base_descriptors = _query_descriptors(base, cfg)
+    descriptors = _orb_descriptors(image, cfg)
+    if base_descriptors is None or descriptors is None:
+        return 0.0
+    matches = cv2.BFMatcher(cv2.NORM_HAMMING).knnMatch(
+        descriptors, base_descriptors, k=2
+    )
+    good = [
+        pair[0]
+        for pair in matches
+        if len(pair) == 2 and pair[0].distance < cfg.ratio * pair[1].distance
+    ]
+    return len(good) / max(min(len(descriptors), len(base_descriptors)), 1)
+
+
+def _get_scoring_pool(workers: int) -> ThreadPoolExecutor:
+    global _scoring_pool
+    if _scoring_pool is None or _scoring_pool[0] != workers:
+        if _scoring_pool is not None:
+            _scoring_pool[1].shutdown(wait=False)
+        _scoring_pool = (
+            workers,
+            ThreadPoolExecutor(max(workers, 1), thread_name_prefix="image-scoring"),
+        )
+    return _scoring_pool[1]
+
+
+async def score_image(image: bytes, base: bytes) -> float:
+    cfg: SimilarityConfig = create(SimilarityConfig)
+    loop = asyncio.get_running_loop()
+    if cfg.mode == "feature":
+        return await loop.run_in_executor(
+            _get_scoring_pool(cfg.workers),
+            calculate_feature_similarity,
+            image,
+            base,
+            cfg,
+        )
+    return await loop.run_in_executor(
+        _get_scoring_pool(cfg.workers), calculate_image_similarity, image, base
+    )
+
+
 @FnCollectEndpoint
 def impl_engine(engine: str):
     yield ENGINE_OVERLOAD.hold(engine)
 
-    def shape(engine: str | None, file: Path) -> ImageSearch: ...
+    def shape(
+        engine: str | None, file: Path, url: str | None = None
+    ) -> ImageSearch: ...
 
     return shape
 
 
-def run_image_search(file: Path, engine: str | None = None) -> list[ImageSearch]:
+def run_image_search(
+    file: Path, engine: str | None = None, url: str | None = None
+) -> list[ImageSearch]:
     if engine is None:
         return [
             engine
             for func in _all_engines
-            if (engine := func(engine, file)) is not None
+            if (engine := func(engine, file, url)) is not None
         ]
     for selection in impl_engine.select():
         if not selection.harvest(ENGINE_OVERLOAD, engine):
@@ -70,7 +190,7 @@ def run_image_search(file: Path, engine: str | None = None) -> list[ImageSearch]
 
         selection.complete()
 
-    if (engine := selection(engine, file)) is not None:  # type: ignore  # noqa
+    if (engine := selection(engine, file, url)) is not None:  # type: ignore  # noqa
         return [engine]
     raise NotImplementedError
 
@@ -90,6 +210,90 @@ async def string_to_image_bytes(engine: BaseSearchEngine, string: str) -> bytes:
     raise ValueError("Invalid image string")
 
 
+@contextmanager
+def coalesce_thumbnails():
+    flights: dict[str, asyncio.Task] = {}
+    token = _search_thumbnails.set(flights)
+    try:
+        yield
+    finally:
+        _search_thumbnails.reset(token)
+        for task in flights.values():
+            task.cancel()
+
+
+def _discard_failed_thumbnail(url: str, task: asyncio.Task):
+    if task.cancelled() or task.exception() is not None:
+        if (entry := _global_thumbnails.get(url)) is not None and entry[1] is task:
+            del _global_thumbnails[url]
+
+
+async def _download_thumbnail(
+    url: str, download: Callable[[str], Awaitable[bytes]]
+) -> bytes:
+    cfg: ThumbnailConfig = create(ThumbnailConfig)
+    if cfg.coalesce_ttl <= 0:
+        return await download(url)
+    now = time.time()
+    for expired in [
+        key
+        for key, (created, _) in _global_thumbnails.items()
+        if now - created > cfg.coalesce_ttl
+    ]:
+        del _global_thumbnails[expired]
+    if (entry := _global_thumbnails.get(url)) is None:
+        task = asyncio.ensure_future(download(url))
+        task.add_done_callback(lambda t: _discard_failed_thumbnail(url, t))
+        _global_thumbnails[url] = (now, task)
+        return await asyncio.shield(task)
+    try:
+        return await asyncio.shield(entry[1])
+    except Exception as e:
+        # The shared download runs on another search's engine client, which may
+        # already be closed; fall back to this caller's own client.
+        logger.debug(f"[ImageSearch] Shared thumbnail download failed: {url}: {e}")
+        return await download(url)
+
+
+async def _process_thumbnail(
+    url: str, download: Callable[[str], Awaitable[bytes]], base: bytes
+) -> tuple[str, TemporaryFile, float]:
+    if url.startswith("http"):
+        thumbnail = await _download_thumbnail(url, download)
+    else:
+        thumbnail = await download(url)
+    digest, thumbnail_file = store_thumbnail(thumbnail)
+    return digest, thumbnail_file, await score_image(thumbnail, base)
+
+
+async def fetch_thumbnail(
+    url: str, download: Callable[[str], Awaitable[bytes]], base: bytes
+) -> tuple[str, TemporaryFile, float]:
+    if not url.startswith("http"):
+        return await _process_thumbnail(url, download, base)
+    key = str(URL(url).with_fragment(None))
+    if (flights := _search_thumbnails.get()) is None:
+        return await _process_thumbnail(key, download, base)
+    if (task := flights.get(key)) is None:
+        task = flights[key] = asyncio.ensure_future(
+            _process_thumbnail(key, download, base)
+        )
+    return await task
+
+
+async def search_url_or_file(
+    engine: BaseSearchEngine, name: str, file: Path, url: str | None = None
+):
+    if url:
+        try:
+            return await engine.search(url=url)
+        except Exception as e:
+            logger.warning(
+                f"[ImageSearch] [{name}] Failed to search by URL, uploading image: {e}"
+            )
+    return await engine.search(file=file)
+
+
 async def general_image_search(
     instance: ImageSearch,
     engine: BaseSearchEngine,
@@ -97,10 +301,11 @@ async def general_image_search(
     icon: str,
     file: Path,
     max_page: int,
+    url: str | None = None,
 ):
     with instance.context(name):
         logger.info(f"[ImageSearch] [{name}] Searching for image")
-        result = await engine.search(file=file)
+        result = await search_url_or_file(engine, name, file, url)
         logger.success(f"[ImageSearch] [{name}] Completed search for image")
         for page_count in range(max_page):
             logger.debug(f"[ImageSearch] [{name}] Processing page {page_count + 1}")
@@ -109,21 +314,23 @@ async def general_image_search(
                 if not selected.thumbnail:
                     continue
                 try:
-                    thumbnail = await string_to_image_bytes(engine, selected.thumbnail)
-                    thumbnail_file = TemporaryFile.from_bytes(thumbnail)
+                    digest, thumbnail_file, similarity = await fetch_thumbnail(
+                        selected.thumbnail,
+                        lambda string: string_to_image_bytes(engine, string),
+                        base_image,
+                    )
                     instance.results.append(
                         ImageSearchResultItem(
                             url=selected.url,
                             image=thumbnail_file.internal_url,
                             text=selected.title,
-                            similarity=calculate_image_similarity(
-                                thumbnail, base_image
-                            ),
+                            similarity=similarity,
                             engine=name,
                             engine_icon=icon,
                             mark="question",
                             favicon=None,
                             text_checkmark=False,
+                            thumbnail=digest,
                         )
                     )
                     instance.temporary_files.append(thumbnail_file)
@@ -135,7 +342,41 @@ async def general_image_search(
         instance.results.sort(key=lambda x: x["similarity"], reverse=True)
 
 
-async def get_reply_image(message: Selector, scene: Selector) -> bytes:
+async def get_reply_picture(message: Selector, scene: Selector) -> Picture:
     rebuilt = await RebuiltMessage.from_selector(message, scene)
-    image = rebuilt.content.get_first(Picture)
-    return await Avilla.current().fetch_resource(image.resource)
+    return rebuilt.content.get_first(Picture)
+
+
+async def upload_image(image: bytes, cfg: SearchUrlConfig) -> str:
+    data = aiohttp.FormData()
+    data.add_field(cfg.upload_field, image, filename="image")
+    async with (
+        it(Launart)
+        .get_component(SessionService)
+        .get(module.identifier)
+        .post(cfg.upload_url, data=data) as res
+    ):
+        res.raise_for_status()
+        result = await res.json(content_type=None)
+    for key in cfg.response_key.split("."):
+        result = result[key]
+    return str(result)
+
+
+async def resolve_search_url(picture: Picture, image: bytes) -> str | None:
+    cfg: SearchUrlConfig = create(SearchUrlConfig, flush=True)
+    if not cfg.enabled:
+        return None
+    if cfg.platform_url:
+        url = str(getattr(picture.resource, "url", "") or "")
+        if url.startswith(("http://", "https://")):
+            logger.debug(f"[ImageSearch] Searching by platform URL: {url}")
+            return url
+    if cfg.upload_url:
+        try:
+            url = await upload_image(image, cfg)
+            logger.debug(f"[ImageSearch] Searching by uploaded URL: {url}")
+            return url
+        except Exception as e:
+            logger.warning(f"[ImageSearch] Failed to upload image: {e}")
+    return None
@@ -1,5 +1,13 @@
+import asyncio
+import inspect
+import json
+import time
 from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime
+from functools import cache
+from hashlib import sha256
+from pathlib import Path
 from typing import Coroutine, Self
 
 from aiohttp import ClientSession
@@ -7,42 +15,106 @@ from creart import it
 from graia.amnesia.message import Element
 from graiax.playwright.service import PlaywrightService
 from jinja2 import Environment, PackageLoader, Template
+from kayaku import config, create
 from launart import Launart
 from loguru import logger
 from yarl import URL
 
 from mephisto.library.service import SessionService
-from mephisto.library.util.storage import download_file
 from mephisto.library.model.metadata import ModuleMetadata
 from mephisto.library.util.playwright import route_fonts
 from mephisto.library.util.storage import File, TemporaryFile
 
+from .cache import CacheConfig, cache_index
+from .store import asset_store
+
 module = ModuleMetadata.current()
 env = Environment(loader=PackageLoader(module.identifier, "templates"), autoescape=True)
 
 
+@config(f"{module.identifier}.render")
+class RenderConfig:
+    concurrency: int = 2
+    reuse: bool = True
+
+
+@config(f"{module.identifier}.asset")
+class AssetConfig:
+    per_host: int = 4
+
+
+ASSET_SCHEME = "lp-asset://"
+
+_render_pool: tuple[int, asyncio.Semaphore] | None = None
+_host_slots: dict[str, tuple[int, asyncio.Semaphore]] = {}
+_revalidating: ContextVar[bool] = ContextVar("_revalidating", default=False)
+_revalidations: dict[tuple[str, ...], asyncio.Task] = {}
+
+
+def render_slot() -> asyncio.Semaphore:
+    global _render_pool
+    cfg: RenderConfig = create(RenderConfig, flush=True)
+    if _render_pool is None or _render_pool[0] != cfg.concurrency:
+        _render_pool = cfg.concurrency, asyncio.Semaphore(max(cfg.concurrency, 1))
+    return _render_pool[1]
+
+
+def host_slot(host: str) -> asyncio.Semaphore:
+    cfg: AssetConfig = create(AssetConfig)
+    if (slot := _host_slots.get(host)) is None or slot[0] != cfg.per_host:
+        _host_slots[host] = slot = cfg.per_host, asyncio.Semaphore(max(cfg.per_host, 1))
+    return slot[1]
+
+
+def _substitute(data, assets: dict[str, object]):
+    if isinstance(data, dict):
+        return {k: _substitute(v, assets) for k, v in data.items()}
+    if isinstance(data, list):
+        return [_substitute(v, assets) for v in data]
+    if isinstance(data, str) and data.startswith(ASSET_SCHEME):
+        return assets.get(data, data)
+    return data
+
+
+@cache
+def template_version() -> str:
+    digest = sha256()
+    for path in sorted((Path(__file__).parent / "templates").rglob("*")):
+        if path.is_file():
+            digest.update(path.as_posix().encode())
+            digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
 class LinkPreview:
     _url: URL | None
     _template: Template | None
     _exceptions: list[Exception]
     _coroutine: Coroutine | None
 
+    _assets: dict[tuple[str, tuple[str, ...]], tuple[str, URL | str, dict]]
+
     temporary_files: dict[URL, TemporaryFile]
     extra_media: list[Element]
     jinja_data: dict
     context: dict
     base_identifier: list[str]
+    key: tuple[str, ...] | None
+    origin: URL | None
 
     def __init__(self):
         self._url = None
         self._template = None
         self._exceptions = []
         self._coroutine = None
+        self._assets = {}
         self.temporary_files = {}
         self.extra_media = []
         self.jinja_data = {}
         self.context = {}
         self.base_identifier = []
+        self.key = None
+        self.origin = None
 
     def update_url(self, url: URL) -> Self:
         self._url = url
@@ -65,6 +137,14 @@ class LinkPreview:
         self.base_identifier = list(map(str, identifier))
         return self
 
+    def set_key(self, *key) -> Self:
+        self.key = tuple(map(str, key))
+        return self
+
+    def set_origin(self, url: URL) -> Self:
+        self.origin = url
+        return self
+
     @property
     def session(self) -> ClientSession:
         return it(Launart).get_component(SessionService).get(module.identifier)
@@ -77,41 +157,188 @@ class LinkPreview:
             self.set_exception(e)
 
     async def cache(
-        self, url: URL, *, identifier: list[str] | None = None, **kwargs
+        self,
+        url: URL,
+        *,
+        identifier: list[str] | None = None,
+        kind: str = "media",
+        **kwargs,
     ) -> TemporaryFile:
-        if identifier:
-            file = File(
-                *module.identifier.split("."), *self.base_identifier, *identifier
+        reference = None
+        if identifier and self.base_identifier:
+            reference = File(
+                *module.identifier.split("."),
+                *self.base_identifier,
+                *identifier[:-1],
+                f"{identifier[-1]}.ref",
             )
-        else:
-            file = File(*module.identifier.split("."), "asset", *url.parts)
 
-        if file.exists:
-            logger.debug(f"[LinkPreview] Using cached file: {file.path}")
-        else:
-            logger.debug(f"[LinkPreview] Updating cache: {file.path}")
-            data = await download_file(url, session_name=module.identifier, **kwargs)
-            file.write_bytes(data)
+        try:
+            file = await asset_store.fetch(url, kind, **kwargs)
+        except Exception:
+            if reference is None or not reference.exists:
+                raise
+            if (file := asset_store.blob(reference.read_text())) is None:
+                raise
+            logger.warning(f"[LinkPreview] Using last known asset: {url}")
+
+        digest = file.path.name
+        if reference is not None and (
+            not reference.exists or reference.read_text() != digest
+        ):
+            reference.write_text(digest)
+            cache_index.record(reference.path, len(digest))
 
         return self.temporary_files.setdefault(url, TemporaryFile.from_file(file.path))
 
-    def load_from_cache(self, *, identifier: list[str]) -> File | None:
-        file = File(*module.identifier.split("."), *self.base_identifier, *identifier)
-        if not file.exists:
+    def asset(
+        self, url: URL | str, *, identifier: list[str] | None = None, **kwargs
+    ) -> str:
+        key = str(url), tuple(identifier or ())
+        if key not in self._assets:
+            token = f"{ASSET_SCHEME}{len(self._assets)}"
+            self._assets[key] = token, url, {"identifier": identifier, **kwargs}
+        return self._assets[key][0]
+
+    async def _fetch_asset(self, url: URL | str, kwargs: dict) -> TemporaryFile:
+        async with host_slot(URL(str(url)).host or ""):
+            return await self.cache(url, **kwargs)
+
+    async def fetch_assets(self):
+        if not (pending := list(self._assets.values())):
+            return
+        self._assets = {}
+        results = await asyncio.gather(
+            *(self._fetch_asset(url, kwargs) for _, url, kwargs in pending),
+            return_exceptions=True,
+        )
+        assets = {}
+        for (token, url, _), result in zip(pending, results):
+            if isinstance(result, Exception):
+                self.set_exception(result)
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                assets[token] = result.internal_url
+        logger.debug(f"[LinkPreview] Fetched {len(assets)}/{len(pending)} asset(s)")
+        self.jinja_data = _substitute(self.jinja_data, assets)
+
+    def load_from_cache(
+        self, *, identifier: list[str], base: list[str] | None = None
+    ) -> File | None:
+        base = self.base_identifier if base is None else base
+        file = File(*module.identifier.split("."), *base, *identifier)
+        if _revalidating.get() or not (entry := cache_index.lookup(file.path)):
+            return
+        cfg: CacheConfig = create(CacheConfig, flush=True)
+        platform = base[0] if base else ""
+        age = time.time() - entry.created
+        if age > cfg.max_age.get(platform, cfg.default_max_age):
+            logger.debug(f"[LinkPreview] Cache expired: {file.path}")
             return
+        if age > cfg.ttl.get(platform, cfg.default_ttl):
+            self.revalidate()
         return file
 
-    def save_to_cache(self, data: str | bytes, *, identifier: list[str]):
-        file = File(*module.identifier.split("."), *self.base_identifier, *identifier)
+    def revalidate(self):
+        key = tuple(self.base_identifier)
+        if self.origin is None or key in _revalidations:
+            return
+
+        async def _revalidate(origin: URL):
+            from .utils import preview_link
+
+            _revalidating.set(True)
+            try:
+                preview = preview_link(origin)
+                await preview.run()
+                if preview._exceptions:
+                    raise preview._exceptions[0]
+            except Exception as e:
+                logger.warning(f"[LinkPreview] Failed to revalidate {origin}: {e}")
+            else:
+                logger.success(f"[LinkPreview] Revalidated cache: {origin}")
+
+        logger.debug(f"[LinkPreview] Serving stale cache: {'/'.join(key)}")
+        task = asyncio.create_task(_revalidate(self.origin))
+        _revalidations[key] = task
+        task.add_done_callback(lambda _: _revalidations.pop(key, None))
+
+    def save_to_cache(
+        self,
+        data: str | bytes,
+        *,
+        identifier: list[str],
+        base: list[str] | None = None,
+    ):
+        base = self.base_identifier if base is None else base
+        file = File(*module.identifier.split("."), *base, *identifier)
         if isinstance(data, str):
             file.write_text(data)
+            cache_index.record(file.path, len(data.encode()))
         else:
             file.write_bytes(data)
+            cache_index.record(file.path, len(data))
+        self.invalidate_render()
+
+    def invalidate_render(self):
+        if not self.base_identifier:
+            return
+        key = File(*module.identifier.split("."), *self.base_identifier, "preview.key")
+        cache_index.discard(key.path)
+        key.path.unlink(missing_ok=True)
+
+    def render_key(
+        self, width: int, device_scale_factor: float, auto_quality: bool
+    ) -> str:
+        meta = self.jinja_data.get("_meta", {})
+        meta = {k: v for k, v in meta.items() if k != "render_time"}
+        data = json.dumps(
+            {**self.jinja_data, "_meta": meta},
+            default=str,
+            ensure_ascii=False,
+            sort_keys=True,
+        )
+        for url, file in self.temporary_files.items():
+            data = data.replace(str(file.internal_url), str(url))
+        return sha256(
+            json.dumps(
+                [
+                    template_version(),
+                    self._template.name if self._template else None,
+                    str(self._url),
+                    width,
+                    device_scale_factor,
+                    auto_quality,
+                    data,
+                ]
+            ).encode()
+        ).hexdigest()
+
+    def load_rendered(self, key: str) -> bytes | None:
+        if not self.base_identifier:
+            return None
+        base = (*module.identifier.split("."), *self.base_identifier)
+        stored = File(*base, "preview.key")
+        image = File(*base, "preview.jpg")
+        if not cache_index.lookup(stored.path) or not cache_index.lookup(image.path):
+            return None
+        if stored.read_text() != key:
+            return None
+        return image.read_bytes()
+
+    def close(self):
+        if self._coroutine is not None and (
+            inspect.getcoroutinestate(self._coroutine) == inspect.CORO_CREATED
+        ):
+            self._coroutine.close()
 
     async def run(self):
         if self._coroutine is None:
             return None
-        return await self._coroutine
+        result = await self._coroutine
+        await self.fetch_assets()
+        return result
 
     async def render(
         self,
@@ -128,6 +355,12 @@ class LinkPreview:
         if self._template is None:
             raise ValueError("Template is not set.")
 
+        cfg: RenderConfig = create(RenderConfig, flush=True)
+        key = self.render_key(width, device_scale_factor, auto_quality)
+        if cfg.reuse and (img := self.load_rendered(key)) is not None:
+            logger.success("[LinkPreview] Using cached preview image.")
+            return img
+
         for file in self.temporary_files.values():
             file.__enter__()
 
@@ -137,12 +370,13 @@ class LinkPreview:
             ] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             html_string = self._template.render(url=str(self._url), **self.jinja_data)
             async with (
+                render_slot(),
                 it(Launart)
                 .get_component(PlaywrightService)
                 .page(
                     viewport={"width": width, "height": 10},
                     device_scale_factor=device_scale_factor,
-                ) as page
+                ) as page,
             ):
                 await route_fonts(page)
                 logger.debug("[LinkPreview] Start rendering page.")
@@ -170,11 +404,11 @@ class LinkPreview:
                 )
                 logger.success("[LinkPreview] Done rendering page.")
                 if self.base_identifier:
-                    File(
-                        *module.identifier.split("."),
-                        *self.base_identifier,
-                        "preview.jpg",
-                    ).write_bytes(img)
+                    base = (*module.identifier.split("."), *self.base_identifier)
+                    File(*base, "preview.jpg").write_bytes(img)
+                    cache_index.record(File(*base, "preview.jpg").path, len(img))
+                    File(*base, "preview.key").write_text(key)
+                    cache_index.record(File(*base, "preview.key").path, len(key))
                     logger.success("[LinkPreview] Saved preview image.")
                 return img
         except Exception as e:
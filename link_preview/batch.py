@@ -0,0 +1,95 @@
+import asyncio
+from io import BytesIO
+
+from kayaku import config, create
+from PIL import Image
+
+from mephisto.library.model.metadata import ModuleMetadata
+
+from .base import LinkPreview
+from .exception import SkipLink
+from .flight import singleflight
+
+module = ModuleMetadata.current()
+
+
+@config(f"{module.identifier}.batch")
+class BatchConfig:
+    max_links: int = 5
+    concurrency: int = 3
+    stack: bool = False
+    stack_quality: int = 85
+
+
+MAX_STACK_HEIGHT = 65500
+
+
+def _stack(frames: list[Image.Image], quality: int) -> bytes:
+    width = max(frame.width for frame in frames)
+    canvas = Image.new(
+        "RGB", (width, sum(frame.height for frame in frames)), (255, 255, 255)
+    )
+    top = 0
+    for frame in frames:
+        canvas.paste(frame, ((width - frame.width) // 2, top))
+        top += frame.height
+    with BytesIO() as buffer:
+        canvas.save(buffer, "jpeg", quality=quality)
+        return buffer.getvalue()
+
+
+def stack_images(images: list[bytes], quality: int = 85) -> list[bytes]:
+    frames = [Image.open(BytesIO(image)).convert("RGB") for image in images]
+    groups: list[list[int]] = [[]]
+    height = 0
+    for index, frame in enumerate(frames):
+        if groups[-1] and height + frame.height > MAX_STACK_HEIGHT:
+            groups.append([])
+            height = 0
+        groups[-1].append(index)
+        height += frame.height
+    return [
+        (
+            images[group[0]]
+            if len(group) == 1
+            else _stack([frames[index] for index in group], quality)
+        )
+        for group in groups
+    ]
+
+
+async def async_stack_images(images: list[bytes], quality: int = 85) -> list[bytes]:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, stack_images, images, quality)
+
+
+async def generate_preview(
+    preview: LinkPreview, semaphore: asyncio.Semaphore
+) -> tuple[bytes | None, LinkPreview]:
+    async with semaphore:
+        try:
+            await preview.run()
+        except SkipLink:
+            return None, preview
+    return await preview.render(), preview
+
+
+async def shared_preview(
+    preview: LinkPreview, semaphore: asyncio.Semaphore
+) -> tuple[bytes | None, LinkPreview]:
+    try:
+        return await singleflight(
+            preview.key, lambda: generate_preview(preview, semaphore)
+        )
+    finally:
+        preview.close()
+
+
+def generate_previews(
+    previews: list[LinkPreview],
+) -> list[asyncio.Task[tuple[bytes | None, LinkPreview]]]:
+    cfg: BatchConfig = create(BatchConfig, flush=True)
+    semaphore = asyncio.Semaphore(max(cfg.concurrency, 1))
+    return [
+        asyncio.create_task(shared_preview(preview, semaphore)) for preview in previews
+    ]
@@ -0,0 +1,302 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from creart import it
+from kayaku import config, create
+from launart import Launart
+from loguru import logger
+from sqlalchemy import delete, insert, select
+
+from mephisto.library.model.metadata import ModuleMetadata
+from mephisto.library.service import DataService
+from mephisto.library.util.storage import File
+
+from .table import LinkPreviewCacheTable
+
+module = ModuleMetadata.current()
+
+
+@config(f"{module.identifier}.cache")
+class CacheConfig:
+    ttl: dict[str, int] = field(
+        default_factory=lambda: {
+            "bilibili": 60 * 60,
+            "bilibili-live": 60,
+            "bilibili-live-user": 24 * 60 * 60,
+            "bluesky": 60 * 60,
+            "twitter": 60 * 60,
+            "weibo": 60 * 60,
+            "youtube": 60 * 60,
+            "youtube-channel": 24 * 60 * 60,
+            "e621": 24 * 60 * 60,
+            "furaffinity": 24 * 60 * 60,
+            "rule34": 24 * 60 * 60,
+        }
+    )
+    max_age: dict[str, int] = field(
+        default_factory=lambda: {
+            "bilibili-live": 60,
+        }
+    )
+    default_ttl: int = 6 * 60 * 60
+    default_max_age: int = 7 * 24 * 60 * 60
+    budget: int = 2 * 1024 * 1024 * 1024
+    low_watermark: float = 0.9
+    policy: str = "lru"
+    interval: int = 300
+    access_resolution: int = 300
+    grace: int = 300
+
+
+@dataclass
+class CacheEntry:
+    platform: str
+    size: int
+    created: float
+    last_access: float
+    hits: int = 0
+    ttl: int = 0
+    synced: float = 0
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+
+
+class CacheIndex:
+    ready: bool
+    entries: dict[str, CacheEntry]
+    stats: dict[str, CacheStats]
+    _dirty: set[str]
+    _removed: set[str]
+
+    def __init__(self):
+        self.ready = False
+        self.entries = {}
+        self.stats = {}
+        self._dirty = set()
+        self._removed = set()
+
+    @property
+    def root(self) -> Path:
+        return File(*module.identifier.split(".")).path
+
+    def _key(self, path: Path) -> str:
+        return path.relative_to(self.root).as_posix()
+
+    @staticmethod
+    def _platform(key: str) -> str:
+        return key.split("/", 1)[0]
+
+    def _entry(self, key: str, size: int, created: float) -> CacheEntry:
+        cfg: CacheConfig = create(CacheConfig)
+        platform = self._platform(key)
+        return CacheEntry(
+            platform=platform,
+            size=size,
+            created=created,
+            last_access=created,
+            ttl=cfg.ttl.get(platform, cfg.default_ttl),
+        )
+
+    def lookup(self, path: Path) -> CacheEntry | None:
+        key = self._key(path)
+        stats = self.stats.setdefault(self._platform(key), CacheStats())
+        if self.ready:
+            entry = self.entries.get(key)
+        elif path.is_file():
+            stat = path.stat()
+            entry = self._entry(key, stat.st_size, stat.st_mtime)
+        else:
+            entry = None
+        if entry is None:
+            stats.misses += 1
+            return None
+        stats.hits += 1
+        if self.ready:
+            cfg: CacheConfig = create(CacheConfig)
+            entry.hits += 1
+            entry.last_access = time.time()
+            if entry.last_access - entry.synced > cfg.access_resolution:
+                self._dirty.add(key)
+        return entry
+
+    def record(self, path: Path, size: int, created: float | None = None):
+        key = self._key(path)
+        self.entries[key] = self._entry(key, size, created or time.time())
+        self._removed.discard(key)
+        self._dirty.add(key)
+
+    def discard(self, path: Path):
+        key = self._key(path)
+        if self.entries.pop(key, None) is not None:
+            self._dirty.discard(key)
+            self._removed.add(key)
+
+    def _scan(self) -> dict[str, tuple[int, float]]:
+        if not self.root.is_dir():
+            return {}
+        return {
+            self._key(path): (stat.st_size, stat.st_mtime)
+            for path in self.root.rglob("*")
+            if path.is_file() and (stat := path.stat())
+        }
+
+    async def rebuild(self):
+        main_engine = (
+            await it(Launart).get_component(DataService).registry.create("main")
+        )
+        rows = (
+            await main_engine.execute(
+                select(
+                    LinkPreviewCacheTable.path,
+                    LinkPreviewCacheTable.size,
+                    LinkPreviewCacheTable.hits,
+                    LinkPreviewCacheTable.created,
+                    LinkPreviewCacheTable.last_access,
+                )
+            )
+        ).fetchall()
+        files = await asyncio.to_thread(self._scan)
+        known = {row[0]: row for row in rows}
+        for key, (size, mtime) in files.items():
+            if key in self.entries:
+                continue
+            entry = self._entry(key, size, mtime)
+            if (row := known.get(key)) is not None and row[1] == size:
+                entry.hits, entry.created, entry.last_access = row[2], row[3], row[4]
+                entry.synced = entry.last_access
+            else:
+                self._dirty.add(key)
+            self.entries[key] = entry
+        self._removed.update(key for key in known if key not in files)
+        self.ready = True
+        await self.flush()
+        logger.success(
+            f"[LinkPreview] Indexed {len(self.entries)} cache file(s), "
+            f"{self.total_size / 1024 / 1024:.1f} MiB"
+        )
+
+    @property
+    def total_size(self) -> int:
+        return sum(entry.size for entry in self.entries.values())
+
+    async def flush(self):
+        if not self._dirty and not self._removed:
+            return
+        dirty, self._dirty = self._dirty, set()
+        removed, self._removed = self._removed, set()
+        try:
+            main_engine = (
+                await it(Launart).get_component(DataService).registry.create("main")
+            )
+            stale = [*dirty, *removed]
+            for i in range(0, len(stale), 500):
+                await main_engine.execute(
+                    delete(LinkPreviewCacheTable).where(
+                        LinkPreviewCacheTable.path.in_(stale[i : i + 500])
+                    )
+                )
+            rows = [
+                {
+                    "path": key,
+                    "platform": entry.platform,
+                    "size": entry.size,
+                    "hits": entry.hits,
+                    "created": entry.created,
+                    "last_access": entry.last_access,
+                    "ttl": entry.ttl,
+                }
+                for key in dirty
+                if (entry := self.entries.get(key)) is not None
+            ]
+            for i in range(0, len(rows), 500):
+                await main_engine.execute(
+                    insert(LinkPreviewCacheTable).values(rows[i : i + 500])
+                )
+            for row in rows:
+                if (entry := self.entries.get(row["path"])) is not None:
+                    entry.synced = row["last_access"]
+        except Exception:
+            self._dirty |= dirty
+            self._removed |= removed
+            raise
+
+    def _victims(self, cfg: CacheConfig) -> list[str]:
+        total = self.total_size
+        if total <= cfg.budget:
+            return []
+        cutoff = time.time() - cfg.grace
+        idle = [k for k, entry in self.entries.items() if entry.last_access < cutoff]
+        if cfg.policy == "lfu":
+            order = sorted(
+                idle, key=lambda k: (self.entries[k].hits, self.entries[k].last_access)
+            )
+        else:
+            order = sorted(idle, key=lambda k: self.entries[k].last_access)
+        target = cfg.budget * cfg.low_watermark
+        victims = []
+        for key in order:
+            if total <= target:
+                break
+            total -= self.entries[key].size
+            victims.append(key)
+        return victims
+
+    async def evict(self):
+        cfg: CacheConfig = create(CacheConfig, flush=True)
+        if not (victims := self._victims(cfg)):
+            return
+        freed = sum(self.entries[key].size for key in victims)
+        for key in victims:
+            self.discard(self.root / key)
+
+        def _unlink():
+            for key in victims:
+                (self.root / key).unlink(missing_ok=True)
+
+        await asyncio.to_thread(_unlink)
+        logger.info(
+            f"[LinkPreview] Evicted {len(victims)} cache file(s), "
+            f"freed {freed / 1024 / 1024:.1f} MiB"
+        )
+
+    def report(self) -> dict[str, dict]:
+        report: dict[str, dict] = {}
+        for entry in self.entries.values():
+            platform = report.setdefault(entry.platform, {"entries": 0, "size": 0})
+            platform["entries"] += 1
+            platform["size"] += entry.size
+        for name, stats in self.stats.items():
+            platform = report.setdefault(name, {"entries": 0, "size": 0})
+            total = stats.hits + stats.misses
+            platform.update(
+                hits=stats.hits,
+                misses=stats.misses,
+                hit_rate=stats.hits / total if total else 0.0,
+            )
+        return report
+
+    async def run(self):
+        while True:
+            cfg: CacheConfig = create(CacheConfig, flush=True)
+            await asyncio.sleep(cfg.interval)
+            try:
+                await self.evict()
+                await self.flush()
+            except Exception as e:
+                logger.error(f"[LinkPreview] Cache maintenance failed: {e}")
+                continue
+            for name, platform in sorted(self.report().items()):
+                logger.debug(
+                    f"[LinkPreview] Cache {name}: {platform['entries']} file(s), "
+                    f"{platform['size'] / 1024 / 1024:.1f} MiB, "
+                    f"hit rate {platform.get('hit_rate', 0.0):.1%}"
+                )
+
+
+cache_index = CacheIndex()
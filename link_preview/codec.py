@@ -0,0 +1,191 @@
+import asyncio
+import json
+import os
+from dataclasses import field
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from kayaku import config, create
+from loguru import logger
+
+from mephisto.library.model.metadata import ModuleMetadata
+from mephisto.library.util.storage import File
+
+from .cache import cache_index
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+module = ModuleMetadata.current()
+
+MAGIC = b"LPC"
+VERSION = 1
+FORMATS = {"json": 0, "orjson": 1, "msgpack": 2}
+COMPRESSIONS = {"none": 0, "zstd": 1}
+
+
+@config(f"{module.identifier}.codec")
+class CodecConfig:
+    format: str = "auto"
+    compression: str = "auto"
+    level: int = 3
+    operators: list[str] = field(default_factory=list)
+
+
+def _format(cfg: CodecConfig) -> str:
+    if cfg.format != "auto":
+        return cfg.format
+    if msgpack is not None:
+        return "msgpack"
+    if orjson is not None:
+        return "orjson"
+    return "json"
+
+
+def _compression(cfg: CodecConfig) -> str:
+    if cfg.compression != "auto":
+        return cfg.compression
+    return "zstd" if zstandard is not None else "none"
+
+
+def encode(data: Any) -> bytes:
+    cfg: CodecConfig = create(CodecConfig, flush=True)
+    match fmt := _format(cfg):
+        case "msgpack":
+            payload = msgpack.packb(data, use_bin_type=True)
+        case "orjson":
+            payload = orjson.dumps(data)
+        case "json":
+            payload = json.dumps(data, ensure_ascii=False).encode()
+        case _:
+            raise ValueError(f"Unknown cache format: {fmt}")
+    match compression := _compression(cfg):
+        case "zstd":
+            payload = zstandard.ZstdCompressor(level=cfg.level).compress(payload)
+        case "none":
+            pass
+        case _:
+            raise ValueError(f"Unknown cache compression: {compression}")
+    return MAGIC + bytes([VERSION, FORMATS[fmt], COMPRESSIONS[compression]]) + payload
+
+
+def is_encoded(data: bytes) -> bool:
+    return data[:3] == MAGIC and len(data) >= 6
+
+
+def decode(data: bytes, *, legacy: Callable[[bytes], Any] = json.loads) -> Any:
+    if not is_encoded(data):
+        return legacy(data)
+    version, fmt, compression = data[3], data[4], data[5]
+    if version != VERSION:
+        raise ValueError(f"Unsupported cache version: {version}")
+    payload = data[6:]
+    match compression:
+        case 1 if zstandard is None:
+            raise ValueError("Cache is zstd-compressed but zstandard is missing")
+        case 1:
+            payload = zstandard.ZstdDecompressor().decompress(payload)
+        case 0:
+            pass
+        case _:
+            raise ValueError(f"Unknown cache compression: {compression}")
+    match fmt:
+        case 2 if msgpack is None:
+            raise ValueError("Cache is msgpack-encoded but msgpack is missing")
+        case 2:
+            return msgpack.unpackb(payload, raw=False)
+        case 1 if orjson is not None:
+            return orjson.loads(payload)
+        case 0 | 1:
+            return json.loads(payload)
+        case _:
+            raise ValueError(f"Unknown cache format: {fmt}")
+
+
+def decode_file(
+    file: File | None, *, legacy: Callable[[bytes], Any] = json.loads
+) -> Any | None:
+    if file is None:
+        return None
+    try:
+        return decode(file.read_bytes(), legacy=legacy)
+    except Exception as e:
+        logger.warning(f"[LinkPreview] Ignoring unreadable cache {file.path}: {e}")
+        return None
+
+
+_migrations: dict[str, tuple[str, Callable[[Path], Awaitable[Any]]]] = {}
+
+
+def register_migration(
+    name: str, target: str, loader: Callable[[Path], Awaitable[Any]]
+):
+    _migrations[name] = target, loader
+
+
+async def _load_json(path: Path) -> Any:
+    return json.loads(await asyncio.to_thread(path.read_bytes))
+
+
+async def _load_text(path: Path) -> str:
+    return await asyncio.to_thread(path.read_text)
+
+
+for _name in ("post.json", "video.json", "channel.json", "status.json"):
+    register_migration(_name, _name, _load_json)
+register_migration("submission.html", "submission.html", _load_text)
+
+
+def _pending_migrations() -> list[Path]:
+    root = File(*module.identifier.split(".")).path
+    if not root.is_dir():
+        return []
+    pending = []
+    for path in root.rglob("*"):
+        if not path.is_file() or path.name not in _migrations:
+            continue
+        with path.open("rb") as f:
+            if not is_encoded(f.read(6)):
+                pending.append(path)
+    return pending
+
+
+def _write_migrated(path: Path, target: str, data: bytes) -> float:
+    created = path.stat().st_mtime
+    migrated = path.with_name(target)
+    migrated.write_bytes(data)
+    os.utime(migrated, (created, created))
+    if target != path.name:
+        path.unlink(missing_ok=True)
+    return created
+
+
+async def migrate_cache() -> tuple[int, int]:
+    migrated = failed = 0
+    for path in await asyncio.to_thread(_pending_migrations):
+        target, loader = _migrations[path.name]
+        try:
+            data = encode(await loader(path))
+            created = await asyncio.to_thread(_write_migrated, path, target, data)
+        except Exception as e:
+            logger.warning(f"[LinkPreview] Failed to migrate {path}: {e}")
+            failed += 1
+            continue
+        cache_index.record(path.with_name(target), len(data), created)
+        if target != path.name:
+            cache_index.discard(path)
+        migrated += 1
+    logger.success(f"[LinkPreview] Migrated {migrated} cache file(s)")
+    return migrated, failed
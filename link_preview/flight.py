@@ -0,0 +1,29 @@
+import asyncio
+from typing import Awaitable, Callable, TypeVar
+
+from loguru import logger
+
+T = TypeVar("T")
+
+_flights: dict[tuple, asyncio.Task] = {}
+
+
+async def singleflight(key: tuple | None, factory: Callable[[], Awaitable[T]]) -> T:
+    if key is None:
+        return await factory()
+    if (task := _flights.get(key)) is not None:
+        logger.debug(f"[LinkPreview] Joining in-flight preview: {key}")
+        return await asyncio.shield(task)
+
+    async def _run() -> T:
+        return await factory()
+
+    task = asyncio.create_task(_run())
+    _flights[key] = task
+
+    def _discard(_):
+        if _flights.get(key) is task:
+            del _flights[key]
+
+    task.add_done_callback(_discard)
+    return await asyncio.shield(task)
@@ -1,8 +1,7 @@
-import json
+import asyncio
 import re
 from datetime import datetime
 
-import httpx
 from flywheel import global_collect
 from loguru import logger
 from yarl import URL
@@ -10,7 +9,9 @@ from yarl import URL
 from mephisto.library.model.metadata import ModuleMetadata
 
 from ..base import LinkPreview
+from ..codec import decode_file, encode
 from ..exception import InvalidLink, SkipLink
+from ..resolver import link_resolver
 from ..utils import impl_preview_domain, process_num, register_link_pattern
 
 module = ModuleMetadata.current()
@@ -22,6 +23,9 @@ VIDEO_LINK_PATTERN = re.compile(
 LIVE_LINK_PATTERN = re.compile(
     r"(?:https?://)?(?:live\.)?bilibili\.com/(?P<live_id>\d+)"
 )
+SHORT_TARGET_PATTERN = re.compile(
+    f"{VIDEO_LINK_PATTERN.pattern}|{LIVE_LINK_PATTERN.pattern}"
+)
 LINK_TEMPLATE = "https://www.bilibili.com/video/av{id}"
 LIVE_LINK_TEMPLATE = "https://live.bilibili.com/{live_id}"
 
@@ -33,13 +37,18 @@ _HEADERS = {
     )
 }
 
-register_link_pattern(re.compile(r"((?:https?://)?(?:.*?\.)?b23\.tv/\w+)"))
+register_link_pattern(
+    re.compile(r"((?:https?://)?(?:[\w-]+\.)?b23\.tv/\w+)"), "b23.tv/"
+)
 register_link_pattern(
     re.compile(
         r"((?:https?://)?(?:www\.)?bilibili\.com/video/(?:[Bb][Vv]\w{10}|[Aa][Vv]\d+))"
-    )
+    ),
+    "bilibili.com/video/",
+)
+register_link_pattern(
+    re.compile(r"((?:https?://)?(?:live\.)?bilibili\.com/\d+)"), "bilibili.com/"
 )
-register_link_pattern(re.compile(r"((?:https?://)?(?:live\.)?bilibili\.com/\d+)"))
 
 
 async def to_jinja(preview: LinkPreview, video: dict) -> dict:
@@ -47,21 +56,18 @@ async def to_jinja(preview: LinkPreview, video: dict) -> dict:
     return {
         "title": data["title"],
         "author": {
-            "profile": (
-                await preview.cache(
-                    data["owner"]["face"],
-                    identifier=[f"{data['owner']['mid']}-face"],
-                )
-            ).internal_url,
+            "profile": preview.asset(
+                data["owner"]["face"],
+                identifier=[f"{data['owner']['mid']}-face"],
+                kind="avatar",
+            ),
             "name": data["owner"]["name"],
             "subtext": data["tname"],
         },
         "content_items": [
             {
                 "type": "photo",
-                "url": (
-                    await preview.cache(data["pic"], identifier=["pic"])
-                ).internal_url,
+                "url": preview.asset(data["pic"], identifier=["pic"]),
             },
             {"type": "title", "text": data["title"]},
         ]
@@ -95,8 +101,8 @@ async def bilibili_preview_full_impl(
         preview.update_template("bilibili.jinja")
         preview.set_base_identifier("bilibili", video_id)
 
-        if video_file := preview.load_from_cache(identifier=["video.json"]):
-            video = json.loads(video_file.read_text())
+        video_file = preview.load_from_cache(identifier=["video.json"])
+        if (video := decode_file(video_file)) is not None:
             logger.success(f"[BilibiliPreview] Using cached video: {video_id}")
             preview.jinja_data.setdefault("_meta", {})["cache_time"] = (
                 video_file.modified_time.strftime("%Y-%m-%d %H:%M:%S")
@@ -113,7 +119,7 @@ async def bilibili_preview_full_impl(
                 "fetch_time"
             ] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             preview.save_to_cache(
-                json.dumps(video, indent=2, ensure_ascii=False),
+                encode(video),
                 identifier=["video.json"],
             )
 
@@ -123,18 +129,31 @@ async def bilibili_preview_full_impl(
 
 async def to_jinja_live(preview: LinkPreview, live: dict, user: dict) -> dict:
     data = live["data"]
+    info = user["data"]["info"]
     return {
         "title": data["title"],
         "author": {
-            "profile": user["data"]["info"]["face"],
-            "name": user["data"]["info"]["uname"],
+            "profile": preview.asset(
+                info["face"], identifier=[f"{data['uid']}-face"], kind="avatar"
+            ),
+            "name": info["uname"],
             "subtext": data["area_name"],
         },
         "content_items": filter(
             None,
             (
-                {"type": "photo", "url": data["user_cover"]},
-                data["keyframe"] and {"type": "photo", "url": data["keyframe"]},
+                data["user_cover"]
+                and {
+                    "type": "photo",
+                    "url": preview.asset(data["user_cover"], identifier=["cover"]),
+                },
+                data["keyframe"]
+                and {
+                    "type": "photo",
+                    "url": preview.asset(
+                        data["keyframe"], identifier=["keyframe"], kind="live"
+                    ),
+                },
                 {"type": "title", "text": data["title"]},
                 *(
                     {"type": "text", "text": line}
@@ -154,32 +173,72 @@ async def to_jinja_live(preview: LinkPreview, live: dict, user: dict) -> dict:
     }
 
 
+def check_response(data: dict, kind: str, item_id: str):
+    if data.get("code") != 0 or not data.get("data"):
+        raise RuntimeError(
+            f"[BilibiliPreview] Failed to fetch {kind} {item_id}: "
+            f"{data.get('code')} {data.get('message') or data.get('msg')}"
+        )
+
+
+async def fetch_live_room(preview: LinkPreview, live_id: str) -> dict:
+    file = preview.load_from_cache(identifier=["room.json"])
+    if (data := decode_file(file)) is not None:
+        logger.success(f"[BilibiliPreview] Using cached live: {live_id}")
+        preview.jinja_data.setdefault("_meta", {})["cache_time"] = (
+            file.modified_time.strftime("%Y-%m-%d %H:%M:%S")
+        )
+        return data
+    async with preview.session.get(
+        f"https://api.live.bilibili.com/room/v1/Room/get_info?room_id={live_id}",
+        headers=_HEADERS,
+    ) as res:
+        live = await res.json()
+    check_response(live, "live", live_id)
+    logger.success(f"[BilibiliPreview] Done fetching live: {live_id}")
+    preview.jinja_data.setdefault("_meta", {})["fetch_time"] = datetime.now().strftime(
+        "%Y-%m-%d %H:%M:%S"
+    )
+    preview.save_to_cache(encode(live), identifier=["room.json"])
+    return live
+
+
+async def fetch_live_user(preview: LinkPreview, uid: str) -> dict:
+    base = ["bilibili-live-user", uid]
+    file = preview.load_from_cache(identifier=["user.json"], base=base)
+    if (data := decode_file(file)) is not None:
+        logger.success(f"[BilibiliPreview] Using cached live user: {uid}")
+        return data
+    async with preview.session.get(
+        f"https://api.live.bilibili.com/live_user/v1/Master/info?uid={uid}",
+        headers=_HEADERS,
+    ) as res:
+        user = await res.json()
+    check_response(user, "live user", uid)
+    logger.success(f"[BilibiliPreview] Done fetching live user: {uid}")
+    preview.save_to_cache(encode(user), identifier=["user.json"], base=base)
+    return user
+
+
 async def bilibili_preview_live_impl(preview: LinkPreview, live_id: str) -> LinkPreview:
     with preview.capture_exception():
         logger.debug(f"[BilibiliPreview] Got live id: {live_id}")
-        preview.update_url(URL(LINK_TEMPLATE.format(id=live_id)))
+        preview.update_url(URL(LIVE_LINK_TEMPLATE.format(live_id=live_id)))
         preview.update_template("bilibili_live.jinja")
-        preview.set_base_identifier("bilibili", f"live-{live_id}")
-
-        async with preview.session.get(
-            f"https://api.live.bilibili.com/room/v1/Room/get_info"
-            f"?room_id={live_id}",
-            headers=_HEADERS,
-        ) as res:
-            live = await res.json()
-            logger.success(f"[BilibiliPreview] Done fetching live: {live_id}")
-        async with preview.session.get(
-            f"https://api.live.bilibili.com/live_user/v1/Master/info"
-            f"?uid={live['data']['uid']}",
-            headers=_HEADERS,
-        ) as res:
-            user = await res.json()
-            logger.success(
-                f"[BilibiliPreview] Done fetching live user: {live['data']['uid']}"
+        preview.set_base_identifier("bilibili-live", live_id)
+
+        uid_base = ["bilibili-live-user", f"room-{live_id}"]
+        if uid_file := preview.load_from_cache(identifier=["uid"], base=uid_base):
+            uid = uid_file.read_text()
+            live, user = await asyncio.gather(
+                fetch_live_room(preview, live_id), fetch_live_user(preview, uid)
             )
-        preview.jinja_data.setdefault("_meta", {})[
-            "fetch_time"
-        ] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        else:
+            live, uid = await fetch_live_room(preview, live_id), None
+        if str(live["data"]["uid"]) != uid:
+            uid = str(live["data"]["uid"])
+            preview.save_to_cache(uid, identifier=["uid"], base=uid_base)
+            user = await fetch_live_user(preview, uid)
 
         preview.jinja_data.update({"post": await to_jinja_live(preview, live, user)})
         return preview
@@ -190,9 +249,11 @@ async def bilibili_preview_short_impl(
 ) -> LinkPreview:
     with preview.capture_exception():
         logger.debug(f"[BilibiliPreview] Got short id: {short_id}")
-        async with httpx.AsyncClient(follow_redirects=True) as client:
-            resp = await client.get(f"https://b23.tv/{short_id}")
-            url = str(resp.url)
+        url = await link_resolver.resolve(
+            f"https://b23.tv/{short_id}", SHORT_TARGET_PATTERN, headers=_HEADERS
+        )
+        if url is None:
+            raise SkipLink(f"Unresolvable bilibili short URL: {short_id}")
         if video_id := VIDEO_LINK_PATTERN.search(url):
             return await bilibili_preview_full_impl(preview, video_id.group("video_id"))
         elif live_id := LIVE_LINK_PATTERN.search(url):
@@ -206,6 +267,7 @@ async def bilibili_preview_short_impl(
 def bilibili_preview_full(domain: str, url: URL) -> LinkPreview:
     preview = LinkPreview()
     if match := VIDEO_LINK_PATTERN.search(str(url)):
+        preview.set_key("bilibili", match.group("video_id"))
         return preview.set_coroutine(
             bilibili_preview_full_impl(preview, match.group("video_id"))
         )
@@ -217,6 +279,7 @@ def bilibili_preview_full(domain: str, url: URL) -> LinkPreview:
 def bilibili_preview_live(domain: str, url: URL) -> LinkPreview:
     preview = LinkPreview()
     if match := LIVE_LINK_PATTERN.search(str(url)):
+        preview.set_key("bilibili-live", match.group("live_id"))
         return preview.set_coroutine(
             bilibili_preview_live_impl(preview, match.group("live_id"))
         )
@@ -229,6 +292,7 @@ def bilibili_preview_live(domain: str, url: URL) -> LinkPreview:
 def bilibili_preview_short(domain: str, url: URL) -> LinkPreview:
     preview = LinkPreview()
     if match := SHORT_LINK_PATTERN.search(str(url)):
+        preview.set_key("bilibili-short", match.group("short_id"))
         return preview.set_coroutine(
             bilibili_preview_short_impl(preview, match.group("short_id"))
         )
@@ -1,5 +1,4 @@
 import html
-import json
 import re
 from datetime import datetime
 
@@ -12,6 +11,7 @@ from mephisto.library.model.metadata import ModuleMetadata
 from mephisto.library.util.storage import TemporaryFile
 
 from ..base import LinkPreview
+from ..codec import decode_file, encode
 from ..exception import InvalidLink
 from ..utils import (
     PLACEHOLDER,
@@ -35,8 +35,11 @@ BSKY_API = (
     "https://public.api.bsky.app/xrpc/app.bsky.feed.getPostThread?uri={uri}&depth=10"
 )
 
-register_link_pattern(re.compile(r"(?:https?://)?(bsky\.app/profile/[^/]+/post/[^/]+)"))
-register_link_pattern(re.compile(r"(at://[^/]+/app.bsky.feed.post/[^/]+)"))
+register_link_pattern(
+    re.compile(r"(?:https?://)?(bsky\.app/profile/[^/]+/post/[^/]+)"),
+    "bsky.app/profile/",
+)
+register_link_pattern(re.compile(r"(at://[^/]+/app.bsky.feed.post/[^/]+)"), "at://")
 
 
 @config(f"{module.identifier}.credentials.bluesky")
@@ -57,9 +60,7 @@ async def embed_images(preview: LinkPreview, data: dict) -> list[dict]:
     return [
         {
             "type": "photo",
-            "url": (
-                await preview.cache(URL(x["fullsize"]), identifier=[f"photo-{i}"])
-            ).internal_url,
+            "url": preview.asset(URL(x["fullsize"]), identifier=[f"photo-{i}"]),
         }
         for i, x in enumerate(data["images"])
     ]
@@ -85,9 +86,7 @@ async def embed_video(preview: LinkPreview, data: dict) -> list[dict]:
     return [
         {
             "type": "video",
-            "url": (
-                await preview.cache(URL(url), identifier=["video-thumbnail"])
-            ).internal_url,
+            "url": preview.asset(URL(url), identifier=["video-thumbnail"]),
             "text": "Video",
         }
     ]
@@ -127,12 +126,11 @@ async def to_jinja_single(preview: LinkPreview, post: dict) -> dict:
             )
     return {
         "author": {
-            "profile": (
-                await preview.cache(
-                    post["author"]["avatar"],
-                    identifier=[f"{post['author']['handle']}-avatar"],
-                )
-            ).internal_url,
+            "profile": preview.asset(
+                post["author"]["avatar"],
+                identifier=[f"{post['author']['handle']}-avatar"],
+                kind="avatar",
+            ),
             "name": post["author"]["displayName"],
             "handle": f"@{post['author']['handle']}",
         },
@@ -155,8 +153,8 @@ async def bluesky_preview_impl(
         preview.update_template("bluesky.jinja")
         preview.set_base_identifier("bluesky", handle, rkey)
 
-        if file := preview.load_from_cache(identifier=["post.json"]):
-            data = json.loads(file.read_text())
+        file = preview.load_from_cache(identifier=["post.json"])
+        if (data := decode_file(file)) is not None:
             logger.success(f"[BlueskyPreview] Using cached post {handle}/{rkey}")
             preview.jinja_data.setdefault("_meta", {})["cache_time"] = (
                 file.modified_time.strftime("%Y-%m-%d %H:%M:%S")
@@ -174,9 +172,7 @@ async def bluesky_preview_impl(
             preview.jinja_data.setdefault("_meta", {})[
                 "fetch_time"
             ] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            preview.save_to_cache(
-                json.dumps(data, indent=2, ensure_ascii=False), identifier=["post.json"]
-            )
+            preview.save_to_cache(encode(data), identifier=["post.json"])
 
         preview.jinja_data.update({"posts": await to_jinja(preview, data)})
         return preview
@@ -196,6 +192,7 @@ def bluesky_preview_domain(domain: str, url: URL) -> LinkPreview:
                 InvalidLink("Invalid bluesky post URL: missing rkey.")
             )
         if handle and rkey:
+            preview.set_key("bluesky", handle, rkey)
             preview.set_coroutine(bluesky_preview_impl(preview, handle, rkey))
     else:
         preview.set_exception(InvalidLink(f"Invalid bluesky post URL: {url}"))
@@ -216,6 +213,7 @@ def bluesky_preview_scheme(scheme: str, url: URL) -> LinkPreview:
                 InvalidLink("Invalid AT protocol post URL: missing rkey.")
             )
         if handle and rkey:
+            preview.set_key("bluesky", handle, rkey)
             preview.set_coroutine(bluesky_preview_impl(preview, handle, rkey))
     else:
         preview.set_exception(InvalidLink(f"Invalid AT protocol post URL: {url}"))
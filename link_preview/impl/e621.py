@@ -1,4 +1,3 @@
-import json
 import re
 from base64 import b64encode
 from datetime import datetime
@@ -11,6 +10,7 @@ from yarl import URL
 from mephisto.library.model.metadata import ModuleMetadata
 
 from ..base import LinkPreview
+from ..codec import decode_file, encode
 from ..exception import InvalidLink
 from ..utils import impl_preview_domain, process_num, register_link_pattern
 
@@ -25,7 +25,9 @@ _RATING_MAP: dict[str, str] = {
     "e": "Explicit",
 }
 
-register_link_pattern(re.compile(r"((?:https?://)?e621\.net/posts/\d+)"))
+register_link_pattern(
+    re.compile(r"((?:https?://)?e621\.net/posts/\d+)"), "e621.net/posts/"
+)
 
 
 def build_tags(post: dict) -> list[dict]:
@@ -65,13 +67,11 @@ async def to_jinja(preview: LinkPreview, data: dict) -> dict:
         "content_items": [
             {
                 "type": "photo",
-                "url": (
-                    await preview.cache(
-                        post["sample"]["url"],
-                        identifier=["photo"],
-                        headers=build_header(),
-                    )
-                ).internal_url,
+                "url": preview.asset(
+                    post["sample"]["url"],
+                    identifier=["photo"],
+                    headers=build_header(),
+                ),
             },
         ]
         + [{"type": "text", "text": x} for x in post["description"].splitlines()]
@@ -93,8 +93,8 @@ async def e621_preview_impl(preview: LinkPreview, post_id: str) -> LinkPreview:
         preview.update_template("e621.jinja")
         preview.set_base_identifier("e621", post_id)
 
-        if file := preview.load_from_cache(identifier=["post.json"]):
-            data = json.loads(file.read_text())
+        file = preview.load_from_cache(identifier=["post.json"])
+        if (data := decode_file(file)) is not None:
             logger.success(f"[E621Preview] Using cached post {post_id}")
             preview.jinja_data.setdefault("_meta", {})["cache_time"] = (
                 file.modified_time.strftime("%Y-%m-%d %H:%M:%S")
@@ -109,7 +109,7 @@ async def e621_preview_impl(preview: LinkPreview, post_id: str) -> LinkPreview:
                 "fetch_time"
             ] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             preview.save_to_cache(
-                json.dumps(data, indent=2, ensure_ascii=False),
+                encode(data),
                 identifier=["post.json"],
             )
 
@@ -122,6 +122,7 @@ async def e621_preview_impl(preview: LinkPreview, post_id: str) -> LinkPreview:
 def e621_preview(domain: str, url: URL) -> LinkPreview:
     preview = LinkPreview()
     if matched := LINK_PATTERN.search(str(url)):
+        preview.set_key("e621", matched.group("post_id"))
         return preview.set_coroutine(
             e621_preview_impl(preview, matched.group("post_id"))
         )
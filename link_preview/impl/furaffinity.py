@@ -10,6 +10,7 @@ from yarl import URL
 from mephisto.library.model.metadata import ModuleMetadata
 
 from ..base import LinkPreview
+from ..codec import decode_file, encode
 from ..exception import InvalidLink
 from ..utils import impl_preview_domain, process_num, register_link_pattern
 
@@ -20,7 +21,9 @@ LINK_PATTERN = re.compile(
 )
 LINK_TEMPLATE = "https://www.furaffinity.net/view/{submission}"
 
-register_link_pattern(re.compile(r"((?:https?://)?furaffinity\.net/view/\d+)"))
+register_link_pattern(
+    re.compile(r"((?:https?://)?furaffinity\.net/view/\d+)"), "furaffinity.net/view/"
+)
 
 
 @config(f"{module.identifier}.credentials.furaffinity")
@@ -58,13 +61,11 @@ async def to_jinja(preview: LinkPreview, data: str) -> dict:
             content.append(
                 {
                     "type": "photo",
-                    "url": (
-                        await preview.cache(
-                            url,
-                            identifier=["photo"],
-                            cookies={"a": cred.cookie_a, "b": cred.cookie_b},
-                        )
-                    ).internal_url,
+                    "url": preview.asset(
+                        url,
+                        identifier=["photo"],
+                        cookies={"a": cred.cookie_a, "b": cred.cookie_b},
+                    ),
                 }
             )
 
@@ -103,13 +104,12 @@ async def to_jinja(preview: LinkPreview, data: str) -> dict:
 
     return {
         "author": {
-            "profile": (
-                await preview.cache(
-                    profile_url,
-                    identifier=[f"{author_name}-avatar"],
-                    cookies={"a": cred.cookie_a, "b": cred.cookie_b},
-                )
-            ).internal_url,
+            "profile": preview.asset(
+                profile_url,
+                identifier=[f"{author_name}-avatar"],
+                kind="avatar",
+                cookies={"a": cred.cookie_a, "b": cred.cookie_b},
+            ),
             "name": author_name,
             "handle": xpath('//span[@class="category-name"]/text()')
             + " / "
@@ -137,8 +137,8 @@ async def furaffinity_preview_impl(
         preview.update_template("furaffinity.jinja")
         preview.set_base_identifier("furaffinity", submission)
 
-        if file := preview.load_from_cache(identifier=["submission.html"]):
-            data = file.read_text()
+        file = preview.load_from_cache(identifier=["submission.html"])
+        if (data := decode_file(file, legacy=bytes.decode)) is not None:
             logger.success(f"[FurAffinityPreview] Using cached submission {submission}")
             preview.jinja_data.setdefault("_meta", {})["cache_time"] = (
                 file.modified_time.strftime("%Y-%m-%d %H:%M:%S")
@@ -156,7 +156,7 @@ async def furaffinity_preview_impl(
             preview.jinja_data.setdefault("_meta", {})[
                 "fetch_time"
             ] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            preview.save_to_cache(data, identifier=["submission.html"])
+            preview.save_to_cache(encode(data), identifier=["submission.html"])
 
         preview.jinja_data.update({"posts": [await to_jinja(preview, data)]})
         return preview
@@ -168,6 +168,7 @@ async def furaffinity_preview_impl(
 def furaffinity_preview(domain: str, url: URL) -> LinkPreview:
     preview = LinkPreview()
     if matched := LINK_PATTERN.search(str(url)):
+        preview.set_key("furaffinity", matched.group("submission"))
         return preview.set_coroutine(
             furaffinity_preview_impl(preview, matched.group("submission"))
         )
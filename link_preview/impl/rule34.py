@@ -1,4 +1,3 @@
-import json
 import re
 from datetime import datetime
 
@@ -9,6 +8,7 @@ from yarl import URL
 from mephisto.library.model.metadata import ModuleMetadata
 
 from ..base import LinkPreview
+from ..codec import decode_file, encode
 from ..exception import InvalidLink
 from ..utils import impl_preview_domain, register_link_pattern
 
@@ -23,7 +23,8 @@ API_TEMPLATE = (
 )
 
 register_link_pattern(
-    re.compile(r"((?:https?://)?rule34\.xxx/index\.php\?[&=a-z\d]*id=\d+[&=a-z\d]*)")
+    re.compile(r"((?:https?://)?rule34\.xxx/index\.php\?[&=a-z\d]*id=\d+[&=a-z\d]*)"),
+    "rule34.xxx/index.php?",
 )
 
 
@@ -37,9 +38,7 @@ async def to_jinja(preview: LinkPreview, data: list[dict]) -> dict:
         "content_items": [
             {
                 "type": "photo",
-                "url": (
-                    await preview.cache(post["sample_url"], identifier=["photo"])
-                ).internal_url,
+                "url": preview.asset(post["sample_url"], identifier=["photo"]),
             },
             {"type": "hashtag", "tags": post["tags"].split()},
         ],
@@ -57,8 +56,8 @@ async def rule34_preview_impl(preview: LinkPreview, post_id: str) -> LinkPreview
         preview.update_template("rule34.jinja")
         preview.set_base_identifier("rule34", post_id)
 
-        if file := preview.load_from_cache(identifier=["post.json"]):
-            data = json.loads(file.read_text())
+        file = preview.load_from_cache(identifier=["post.json"])
+        if (data := decode_file(file)) is not None:
             logger.debug(f"[Rule34Preview] Using cached post {post_id}")
             preview.jinja_data.setdefault("_meta", {})["cache_time"] = (
                 file.modified_time.strftime("%Y-%m-%d %H:%M:%S")
@@ -70,9 +69,7 @@ async def rule34_preview_impl(preview: LinkPreview, post_id: str) -> LinkPreview
             preview.jinja_data.setdefault("_meta", {})[
                 "fetch_time"
             ] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            preview.save_to_cache(
-                json.dumps(data, indent=2, ensure_ascii=False), identifier=["post.json"]
-            )
+            preview.save_to_cache(encode(data), identifier=["post.json"])
 
         preview.jinja_data.update({"post": await to_jinja(preview, data)})
         return preview
@@ -83,6 +80,7 @@ async def rule34_preview_impl(preview: LinkPreview, post_id: str) -> LinkPreview
 def rule34_preview(domain: str, url: URL) -> LinkPreview:
     preview = LinkPreview()
     if matched := LINK_PATTERN.search(str(url)):
+        preview.set_key("rule34", matched.group("post_id"))
         return preview.set_coroutine(
             rule34_preview_impl(preview, matched.group("post_id"))
         )
@@ -1,7 +1,10 @@
+import asyncio
 import json
 import pickle
 import re
+from contextlib import AsyncExitStack, asynccontextmanager, suppress
 from datetime import datetime
+from pathlib import Path
 
 from creart import it
 from flywheel import global_collect
@@ -21,9 +24,9 @@ from tweet_crawler.model import (
 from yarl import URL
 
 from mephisto.library.model.metadata import ModuleMetadata
-from mephisto.library.service.session import SessionService
 
 from ..base import LinkPreview
+from ..codec import decode_file, encode, register_migration
 from ..exception import InvalidLink
 from ..utils import (
     impl_preview_domain,
@@ -38,8 +41,17 @@ STATUS_LINK_PATTERN = re.compile(
     r"(?:https?://)?(?:www\.)?(?:twitter|x)\.com/\w+/status/(?P<status>\d+)"
 )
 LINK_TEMPLATE = "https://x.com/i/status/{id}"
+TWEET_SCHEMA = 1
 
-register_link_pattern(re.compile(r"((?:https?://)?(?:twitter|x)\.com/\w+/status/\d+)"))
+register_link_pattern(
+    re.compile(r"((?:https?://)?(?:twitter|x)\.com/\w+/status/\d+)"), "/status/"
+)
+
+
+@config(f"{module.identifier}.twitter")
+class TwitterConfig:
+    pool_size: int = 2
+    cookie_save_delay: int = 60
 
 
 @config(f"{module.identifier}.credentials.twitter")
@@ -51,19 +63,6 @@ class TwitterCredentials:
     full_cookies: str = ""
 
 
-async def get_full_link(short_link: str) -> str | None:
-    if not short_link.startswith("http"):
-        short_link = f"https://{short_link}"
-    async with (
-        it(Launart)
-        .get_component(SessionService)
-        .get(module.identifier)
-        .get(url=short_link) as res
-    ):
-        if STATUS_LINK_PATTERN.findall(str(res.url)):
-            return str(res.url).replace("twitter.com", "x.com")
-
-
 async def build_photo(entity: TwitterEntityMediaPhoto) -> dict:
     return {"type": "photo", "url": entity.url}
 
@@ -133,6 +132,26 @@ async def to_jinja(tweet: Tweet | TweetTombstone) -> dict:
     }
 
 
+async def tweet_to_jinja(tweet: Tweet | TweetTombstone, status_id: int) -> list[dict]:
+    tweets = [tweet]
+    if tweet.conversation_threads and any(
+        [status_id in [x.id for x in tweet.conversation_threads[0]]]
+    ):
+        tweets += tweet.conversation_threads[0]
+    return [await to_jinja(tweet) for tweet in tweets]
+
+
+async def _migrate_pickle(path: Path) -> dict:
+    tweet = pickle.loads(await asyncio.to_thread(path.read_bytes))
+    return {
+        "schema": TWEET_SCHEMA,
+        "posts": await tweet_to_jinja(tweet, int(path.parent.name)),
+    }
+
+
+register_migration("tweet.pkl", "tweet.cache", _migrate_pickle)
+
+
 async def prepare_cookie(page: Page):
     cred: TwitterCredentials = create(TwitterCredentials, flush=True)
     if not cred.full_cookies:
@@ -165,6 +184,94 @@ async def prepare_cookie(page: Page):
         await page.context.add_cookies(json.loads(cred.full_cookies))
 
 
+class TwitterPagePool:
+    idle: list[Page]
+    contexts: dict[Page, AsyncExitStack]
+    _slots: tuple[int, asyncio.Semaphore] | None
+    _save_task: asyncio.Task | None
+
+    def __init__(self):
+        self.idle = []
+        self.contexts = {}
+        self._slots = None
+        self._save_task = None
+
+    def _slot(self, size: int) -> asyncio.Semaphore:
+        if self._slots is None or self._slots[0] != size:
+            self._slots = size, asyncio.Semaphore(size)
+        return self._slots[1]
+
+    async def _create(self) -> Page:
+        browser = it(Launart).get_component(PlaywrightService)
+        stack = AsyncExitStack()
+        try:
+            page = await stack.enter_async_context(browser.page())
+            await prepare_cookie(page)
+        except BaseException:
+            await stack.aclose()
+            raise
+        self.contexts[page] = stack
+        logger.debug(f"[TwitterPreview] Opened pooled page #{len(self.contexts)}")
+        return page
+
+    async def _drop(self, page: Page):
+        if (stack := self.contexts.pop(page, None)) is not None:
+            with suppress(Exception):
+                await stack.aclose()
+            logger.debug("[TwitterPreview] Closed pooled page")
+
+    @asynccontextmanager
+    async def acquire(self):
+        cfg: TwitterConfig = create(TwitterConfig, flush=True)
+        size = max(cfg.pool_size, 1)
+        async with self._slot(size):
+            page = self.idle.pop() if self.idle else None
+            if page is not None and page.is_closed():
+                await self._drop(page)
+                page = None
+            if page is None:
+                page = await self._create()
+            healthy = False
+            try:
+                yield page
+                healthy = not page.is_closed()
+            finally:
+                if healthy and len(self.idle) < size:
+                    self.idle.append(page)
+                else:
+                    await self._drop(page)
+
+    async def close(self):
+        if self._save_task is not None:
+            self._save_task.cancel()
+        self.idle.clear()
+        for page in list(self.contexts):
+            await self._drop(page)
+
+    def schedule_cookie_save(self, page: Page):
+        if self._save_task is not None and not self._save_task.done():
+            return
+
+        async def _save():
+            cfg: TwitterConfig = create(TwitterConfig)
+            await asyncio.sleep(cfg.cookie_save_delay)
+            cred: TwitterCredentials = create(TwitterCredentials, flush=True)
+            try:
+                cookies = json.dumps(await page.context.cookies("https://x.com"))
+            except Exception as e:
+                logger.warning(f"[TwitterPreview] Failed to read cookies: {e}")
+                return
+            if cookies != cred.full_cookies:
+                cred.full_cookies = cookies
+                save(TwitterCredentials)
+                logger.debug("[TwitterPreview] Updated cookies.")
+
+        self._save_task = asyncio.create_task(_save())
+
+
+twitter_pages = TwitterPagePool()
+
+
 async def twitter_preview_impl(preview: LinkPreview, status: str) -> LinkPreview:
     with preview.capture_exception():
         status_id = int(status)
@@ -173,16 +280,17 @@ async def twitter_preview_impl(preview: LinkPreview, status: str) -> LinkPreview
         preview.update_template("twitter.jinja")
         preview.set_base_identifier("twitter", status_id)
 
-        browser = it(Launart).get_component(PlaywrightService)
-        async with browser.page() as page:
-            await prepare_cookie(page)
-            if file := preview.load_from_cache(identifier=["tweet.pkl"]):
-                tweet = pickle.loads(file.read_bytes())
-                logger.debug(f"[TwitterPreview] Using cached tweet: {status_id}")
-                preview.jinja_data.setdefault("_meta", {})["cache_time"] = (
-                    file.modified_time.strftime("%Y-%m-%d %H:%M:%S")
-                )
-            else:
+        file = preview.load_from_cache(identifier=["tweet.cache"])
+        if (cached := decode_file(file)) is not None and (
+            cached.get("schema") == TWEET_SCHEMA
+        ):
+            posts = cached["posts"]
+            logger.debug(f"[TwitterPreview] Using cached tweet: {status_id}")
+            preview.jinja_data.setdefault("_meta", {})["cache_time"] = (
+                file.modified_time.strftime("%Y-%m-%d %H:%M:%S")
+            )
+        else:
+            async with twitter_pages.acquire() as page:
                 crawler = TwitterStatusCrawler(page, LINK_TEMPLATE.format(id=status_id))
                 try:
                     if not (tweet := await crawler.run()):
@@ -192,25 +300,19 @@ async def twitter_preview_impl(preview: LinkPreview, status: str) -> LinkPreview
                 except Exception as e:
                     logger.error(f"[TwitterPreview] Error: {e}")
                     raise
-                logger.debug(f"[TwitterPreview] Done crawling tweet: {status_id}")
-                preview.jinja_data.setdefault("_meta", {})[
-                    "fetch_time"
-                ] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                preview.save_to_cache(pickle.dumps(tweet), identifier=["tweet.pkl"])
-
-            cred: TwitterCredentials = create(TwitterCredentials, flush=True)
-            cred.full_cookies = json.dumps(await page.context.cookies("https://x.com"))
-            save(TwitterCredentials)
-            logger.debug(f"[TwitterPreview] Updated cookies.")
-            tweets = [tweet]
-            if tweet.conversation_threads and any(
-                [status_id in [x.id for x in tweet.conversation_threads[0]]]
-            ):
-                tweets += tweet.conversation_threads[0]
-            preview.jinja_data.update(
-                {"posts": [await to_jinja(tweet) for tweet in tweets]}
+                twitter_pages.schedule_cookie_save(page)
+            logger.debug(f"[TwitterPreview] Done crawling tweet: {status_id}")
+            preview.jinja_data.setdefault("_meta", {})[
+                "fetch_time"
+            ] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            posts = await tweet_to_jinja(tweet, status_id)
+            preview.save_to_cache(
+                encode({"schema": TWEET_SCHEMA, "posts": posts}),
+                identifier=["tweet.cache"],
             )
-            return preview
+
+        preview.jinja_data.update({"posts": posts})
+        return preview
 
 
 @global_collect
@@ -221,6 +323,7 @@ async def twitter_preview_impl(preview: LinkPreview, status: str) -> LinkPreview
 def twitter_preview_full(domain: str, url: URL) -> LinkPreview:
     preview = LinkPreview()
     if match := STATUS_LINK_PATTERN.search(str(url)):
+        preview.set_key("twitter", match.group("status"))
         return preview.set_coroutine(
             twitter_preview_impl(preview, match.group("status"))
         )
@@ -1,16 +1,22 @@
 import json
 import re
+from collections import Counter
 from datetime import datetime
 
+from aiohttp import ClientSession, ClientTimeout
 from creart import it
 from flywheel import global_collect
 from graiax.playwright.service import PlaywrightService
+from kayaku import config, create
 from launart import Launart
 from loguru import logger
 from lxml.html import fromstring
 from yarl import URL
 
+from mephisto.library.model.metadata import ModuleMetadata
+
 from ..base import LinkPreview
+from ..codec import decode_file, encode
 from ..exception import InvalidLink
 from ..utils import (
     impl_preview_domain,
@@ -19,6 +25,8 @@ from ..utils import (
     register_link_pattern,
 )
 
+module = ModuleMetadata.current()
+
 MOBILE_LINK_PATTERN = re.compile(
     r"(?:https?://)?m\.weibo\.cn/(?:detail|status)/(?P<post_id>[^/#?]+)"
 )
@@ -26,11 +34,30 @@ DESKTOP_LINK_PATTERN = re.compile(
     r"(?:https?://)?(?:www\.)?weibo\.com/\d+/(?P<post_id>[^/#?]+)"
 )
 LINK_TEMPLATE = "https://m.weibo.cn/detail/{post_id}"
+STATUS_API = "https://m.weibo.cn/statuses/show?id={post_id}"
+VISITOR_URL = "https://passport.weibo.com/visitor/genvisitor2"
+MOBILE_UA = (
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) "
+    "AppleWebKit/605.1.15 (KHTML, like Gecko) "
+    "Version/17.0 Mobile/15E148 Safari/604.1"
+)
 
 register_link_pattern(
-    re.compile(r"((?:https?://)?m\.weibo\.cn/(?:detail|status)/[^/#?]+)")
+    re.compile(r"((?:https?://)?m\.weibo\.cn/(?:detail|status)/[^/#?]+)"),
+    "m.weibo.cn/",
 )
-register_link_pattern(re.compile(r"((?:https?://)?weibo\.com/\d+/[^/#?]+)"))
+register_link_pattern(
+    re.compile(r"((?:https?://)?weibo\.com/\d+/[^/#?]+)"), "weibo.com/"
+)
+
+fetch_stats: Counter[str] = Counter()
+_visitor: dict[str, str] = {}
+
+
+@config(f"{module.identifier}.weibo")
+class WeiboConfig:
+    http_first: bool = True
+    timeout: float = 5.0
 
 
 async def to_jinja(preview: LinkPreview, status: dict) -> dict:
@@ -65,12 +92,10 @@ async def to_jinja(preview: LinkPreview, status: dict) -> dict:
         else:
             content_items.pop()
     for i, pic in enumerate(status.get("pics", [])):
-        url = (
-            await preview.cache(
-                URL(re.sub(r"sinaimg\.cn/[^/]+/", "sinaimg.cn/large/", pic["url"])),
-                identifier=[f"photo-{i}"],
-            )
-        ).internal_url
+        url = preview.asset(
+            URL(re.sub(r"sinaimg\.cn/[^/]+/", "sinaimg.cn/large/", pic["url"])),
+            identifier=[f"photo-{i}"],
+        )
         if "type" in pic:
             if pic["type"] == "video":
                 content_items.append(
@@ -88,18 +113,16 @@ async def to_jinja(preview: LinkPreview, status: dict) -> dict:
             content_items.append({"type": "photo", "url": url})
 
     if "page_info" in status and status["page_info"].get("type") == "video":
-        url = (
-            await preview.cache(
-                URL(
-                    re.sub(
-                        r"sinaimg\.cn/[^/]+/",
-                        "sinaimg.cn/large/",
-                        status["page_info"]["page_pic"]["url"],
-                    )
-                ),
-                identifier=[f"page-info-video-thumbnail"],
-            )
-        ).internal_url
+        url = preview.asset(
+            URL(
+                re.sub(
+                    r"sinaimg\.cn/[^/]+/",
+                    "sinaimg.cn/large/",
+                    status["page_info"]["page_pic"]["url"],
+                )
+            ),
+            identifier=[f"page-info-video-thumbnail"],
+        )
         content_items.append(
             {
                 "type": "video",
@@ -124,11 +147,11 @@ async def to_jinja(preview: LinkPreview, status: dict) -> dict:
 
     return {
         "author": {
-            "profile": (
-                await preview.cache(
-                    profile_url, identifier=[f'{status["user"]["id"]}-avatar']
-                )
-            ).internal_url,
+            "profile": preview.asset(
+                profile_url,
+                identifier=[f'{status["user"]["id"]}-avatar'],
+                kind="avatar",
+            ),
             "name": status["user"]["screen_name"],
             "handle": status["user"]["description"],
         },
@@ -142,6 +165,55 @@ async def to_jinja(preview: LinkPreview, status: dict) -> dict:
     }
 
 
+async def _refresh_visitor(session: ClientSession, cfg: WeiboConfig):
+    async with session.post(
+        VISITOR_URL,
+        data={"cb": "visitor_gray_callback", "tid": "", "from": "weibo"},
+        headers={"User-Agent": MOBILE_UA},
+        timeout=ClientTimeout(total=cfg.timeout),
+    ) as res:
+        text = await res.text()
+    if not (matched := re.search(r"\((\{.*\})\)", text, re.S)):
+        raise RuntimeError("Unexpected visitor response")
+    data = json.loads(matched.group(1))["data"]
+    _visitor.update({"SUB": data["sub"], "SUBP": data["subp"]})
+    logger.debug("[WeiboPreview] Refreshed visitor cookies")
+
+
+async def _get_status(session: ClientSession, status_id: str, cfg: WeiboConfig):
+    async with session.get(
+        STATUS_API.format(post_id=status_id),
+        headers={
+            "User-Agent": MOBILE_UA,
+            "Referer": LINK_TEMPLATE.format(post_id=status_id),
+            "X-Requested-With": "XMLHttpRequest",
+            "MWeibo-Pwa": "1",
+        },
+        cookies=_visitor,
+        timeout=ClientTimeout(total=cfg.timeout),
+    ) as res:
+        if res.url.host != "m.weibo.cn" or "json" not in res.content_type:
+            return None
+        return await res.json()
+
+
+async def fetch_status_http(preview: LinkPreview, status_id: str) -> dict | None:
+    cfg: WeiboConfig = create(WeiboConfig)
+    if (result := await _get_status(preview.session, status_id, cfg)) is None:
+        await _refresh_visitor(preview.session, cfg)
+        result = await _get_status(preview.session, status_id, cfg)
+    if not result or result.get("ok") != 1 or not result.get("data"):
+        return None
+    return {"status": result["data"]}
+
+
+async def fetch_status_browser(status_id: str) -> dict:
+    async with it(Launart).get_component(PlaywrightService).page() as page:
+        await page.goto(LINK_TEMPLATE.format(post_id=status_id))
+        await page.wait_for_selector("//article")
+        return await page.evaluate("$render_data")
+
+
 async def weibo_preview_impl(preview: LinkPreview, status_id: str) -> LinkPreview:
     with preview.capture_exception():
         logger.debug(f"[WeiboPreview] Got weibo status: {status_id}")
@@ -149,25 +221,36 @@ async def weibo_preview_impl(preview: LinkPreview, status_id: str) -> LinkPrevie
         preview.update_template("weibo.jinja")
         preview.set_base_identifier("weibo", status_id)
 
-        if file := preview.load_from_cache(identifier=["status.json"]):
-            data = json.loads(file.read_text())
+        file = preview.load_from_cache(identifier=["status.json"])
+        if (data := decode_file(file)) is not None:
             logger.success(f"[WeiboPreview] Using cached weibo status {status_id}")
             preview.jinja_data.setdefault("_meta", {})["cache_time"] = (
                 file.modified_time.strftime("%Y-%m-%d %H:%M:%S")
             )
         else:
-            async with it(Launart).get_component(PlaywrightService).page() as page:
-                await page.goto(LINK_TEMPLATE.format(post_id=status_id))
-                await page.wait_for_selector("//article")
-                data = await page.evaluate("$render_data")
-                logger.success(f"[WeiboPreview] Done fetching weibo status {status_id}")
-                preview.jinja_data.setdefault("_meta", {})[
-                    "fetch_time"
-                ] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                preview.save_to_cache(
-                    json.dumps(data, indent=2, ensure_ascii=False),
-                    identifier=["status.json"],
-                )
+            cfg: WeiboConfig = create(WeiboConfig, flush=True)
+            data = None
+            if cfg.http_first:
+                try:
+                    data = await fetch_status_http(preview, status_id)
+                except Exception as e:
+                    logger.warning(f"[WeiboPreview] HTTP fetch failed: {e}")
+            if data is not None:
+                fetch_stats["http"] += 1
+            else:
+                fetch_stats["browser"] += 1
+                data = await fetch_status_browser(status_id)
+            logger.success(
+                f"[WeiboPreview] Done fetching weibo status {status_id} "
+                f"(http {fetch_stats['http']}, browser {fetch_stats['browser']})"
+            )
+            preview.jinja_data.setdefault("_meta", {})[
+                "fetch_time"
+            ] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            preview.save_to_cache(
+                encode(data),
+                identifier=["status.json"],
+            )
 
     preview.jinja_data.update({"posts": [await to_jinja(preview, data["status"])]})
     return preview
@@ -178,6 +261,7 @@ async def weibo_preview_impl(preview: LinkPreview, status_id: str) -> LinkPrevie
 def weibo_preview_mobile(domain: str, url: URL) -> LinkPreview:
     preview = LinkPreview()
     if matched := MOBILE_LINK_PATTERN.search(str(url)):
+        preview.set_key("weibo", matched.group("post_id"))
         return preview.set_coroutine(
             weibo_preview_impl(preview, matched.group("post_id"))
         )
@@ -189,6 +273,7 @@ def weibo_preview_mobile(domain: str, url: URL) -> LinkPreview:
 def weibo_preview_desktop(domain: str, url: URL) -> LinkPreview:
     preview = LinkPreview()
     if matched := DESKTOP_LINK_PATTERN.match(str(url)):
+        preview.set_key("weibo", matched.group("post_id"))
         return preview.set_coroutine(
             weibo_preview_impl(preview, matched.group("post_id"))
         )
@@ -1,7 +1,8 @@
-import json
+import asyncio
 import re
 from datetime import datetime
 
+from aiohttp import ClientSession
 from flywheel import global_collect
 from kayaku import config, create
 from loguru import logger
@@ -10,6 +11,7 @@ from yarl import URL
 from mephisto.library.model.metadata import ModuleMetadata
 
 from ..base import LinkPreview
+from ..codec import decode_file, encode
 from ..exception import InvalidLink
 from ..utils import impl_preview_domain, process_num, register_link_pattern
 
@@ -21,9 +23,12 @@ VIDEO_LINK_PATTERN = re.compile(
 )
 LINK_TEMPLATE = "https://www.youtube.com/watch?v={id}"
 
-register_link_pattern(re.compile(r"((?:https?://)?(?:www\.)?youtu\.be/\w+)"))
 register_link_pattern(
-    re.compile(r"((?:https?://)?(?:\w+\.)?(?:youtube\.com|youtu\.be)/watch\?v=\w+)")
+    re.compile(r"((?:https?://)?(?:www\.)?youtu\.be/\w+)"), "youtu.be/"
+)
+register_link_pattern(
+    re.compile(r"((?:https?://)?(?:\w+\.)?(?:youtube\.com|youtu\.be)/watch\?v=\w+)"),
+    "/watch?v=",
 )
 
 
@@ -32,18 +37,23 @@ class YouTubeCredentials:
     token: str = ""
 
 
+@config(f"{module.identifier}.youtube")
+class YouTubeConfig:
+    batch_window: float = 0.05
+    batch_timeout: float = 30.0
+
+
 async def to_jinja(preview: LinkPreview, video: dict, channel: dict) -> dict:
     return {
         "title": video["items"][0]["snippet"]["title"],
         "author": {
-            "profile": (
-                await preview.cache(
-                    channel["items"][0]["snippet"]["thumbnails"]["high"]["url"],
-                    identifier=[
-                        f"channel-{channel['items'][0]['id']}-thumbnail-high",
-                    ],
-                )
-            ).internal_url,
+            "profile": preview.asset(
+                channel["items"][0]["snippet"]["thumbnails"]["high"]["url"],
+                identifier=[
+                    f"channel-{channel['items'][0]['id']}-thumbnail-high",
+                ],
+                kind="avatar",
+            ),
             "name": channel["items"][0]["snippet"]["title"],
             "subtext": process_num(channel["items"][0]["statistics"]["subscriberCount"])
             + " subscribers",
@@ -51,12 +61,10 @@ async def to_jinja(preview: LinkPreview, video: dict, channel: dict) -> dict:
         "content_items": [
             {
                 "type": "photo",
-                "url": (
-                    await preview.cache(
-                        video["items"][0]["snippet"]["thumbnails"]["maxres"]["url"],
-                        identifier=["video-thumbnail-maxres"],
-                    )
-                ).internal_url,
+                "url": preview.asset(
+                    video["items"][0]["snippet"]["thumbnails"]["maxres"]["url"],
+                    identifier=["video-thumbnail-maxres"],
+                ),
             },
             {"type": "title", "text": video["items"][0]["snippet"]["title"]},
         ]
@@ -81,6 +89,110 @@ async def to_jinja(preview: LinkPreview, video: dict, channel: dict) -> dict:
     }
 
 
+class VideoBatcher:
+    pending: dict[str, asyncio.Future[dict]]
+    _task: asyncio.Task | None
+    _fetching: set[asyncio.Task]
+
+    def __init__(self):
+        self.pending = {}
+        self._task = None
+        self._fetching = set()
+
+    async def get(self, session: ClientSession, video_id: str) -> dict:
+        if (future := self.pending.get(video_id)) is None:
+            future = asyncio.get_running_loop().create_future()
+            self.pending[video_id] = future
+            if self._task is None or self._task.done():
+                self._task = asyncio.create_task(self._flush(session))
+        cfg: YouTubeConfig = create(YouTubeConfig)
+        async with asyncio.timeout(cfg.batch_timeout):
+            return await asyncio.shield(future)
+
+    async def _flush(self, session: ClientSession):
+        cfg: YouTubeConfig = create(YouTubeConfig, flush=True)
+        pending = self.pending
+        try:
+            await asyncio.sleep(cfg.batch_window)
+            # Requests arriving while this batch is fetched start their own.
+            self.pending, self._task = {}, None
+            self._fetching.add(asyncio.current_task())
+            await self._fetch(session, pending)
+        finally:
+            self._fetching.discard(asyncio.current_task())
+            if self.pending is pending:
+                self.pending = {}
+            for future in pending.values():
+                if not future.done():
+                    future.set_exception(
+                        RuntimeError("[YouTubePreview] Video batch was interrupted")
+                    )
+
+    async def _fetch(self, session: ClientSession, pending: dict[str, asyncio.Future]):
+        ids = list(pending)
+        cred: YouTubeCredentials = create(YouTubeCredentials, flush=True)
+        for i in range(0, len(ids), 50):
+            chunk = ids[i : i + 50]
+            try:
+                async with session.get(
+                    "https://www.googleapis.com/youtube/v3/videos",
+                    params={
+                        "part": "snippet,statistics,status",
+                        "id": ",".join(chunk),
+                        "key": cred.token,
+                    },
+                ) as res:
+                    data = await res.json()
+            except Exception as e:
+                for video_id in chunk:
+                    pending[video_id].set_exception(e)
+                continue
+            logger.debug(f"[YouTubePreview] Fetched {len(chunk)} video(s) in one call")
+            items = {item["id"]: item for item in data.get("items", [])}
+            for video_id in chunk:
+                pending[video_id].set_result(
+                    {
+                        **data,
+                        "items": [items[video_id]] if video_id in items else [],
+                    }
+                )
+
+
+def check_response(data: dict, kind: str, item_id: str):
+    if "error" in data:
+        raise RuntimeError(
+            f"[YouTubePreview] Failed to fetch {kind} {item_id}: "
+            f"{data['error'].get('message', data['error'])}"
+        )
+    if not data.get("items"):
+        raise InvalidLink(f"YouTube {kind} not found: {item_id}")
+
+
+video_batcher = VideoBatcher()
+
+
+async def fetch_channel(preview: LinkPreview, channel_id: str) -> dict:
+    base = ["youtube-channel", channel_id]
+    file = preview.load_from_cache(identifier=["channel.json"], base=base)
+    if (data := decode_file(file)) is not None:
+        logger.debug(f"[YouTubePreview] Using cached channel: {channel_id}")
+        return data
+    cred: YouTubeCredentials = create(YouTubeCredentials, flush=True)
+    async with preview.session.get(
+        "https://www.googleapis.com/youtube/v3/channels",
+        params={
+            "part": "snippet,statistics",
+            "id": channel_id,
+            "key": cred.token,
+        },
+    ) as res:
+        channel = await res.json()
+    check_response(channel, "channel", channel_id)
+    logger.success(f"[YouTubePreview] Done fetching channel: {channel_id}")
+    preview.save_to_cache(encode(channel), identifier=["channel.json"], base=base)
+    return channel
+
+
 async def youtube_preview_impl(preview: LinkPreview, video_id: str) -> LinkPreview:
     with preview.capture_exception():
         logger.debug(f"[YouTubePreview] Got video id: {video_id}")
@@ -88,49 +200,29 @@ async def youtube_preview_impl(preview: LinkPreview, video_id: str) -> LinkPrevi
         preview.update_template("youtube.jinja")
         preview.set_base_identifier("youtube", video_id)
 
-        if (video_file := preview.load_from_cache(identifier=["video.json"])) and (
-            channel_file := preview.load_from_cache(identifier=["channel.json"])
-        ):
-            video = json.loads(video_file.read_text())
-            channel = json.loads(channel_file.read_text())
+        video_file = preview.load_from_cache(identifier=["video.json"])
+        if (video := decode_file(video_file)) is not None:
             logger.success(f"[YouTubePreview] Using cached video: {video_id}")
             preview.jinja_data.setdefault("_meta", {})["cache_time"] = (
                 video_file.modified_time.strftime("%Y-%m-%d %H:%M:%S")
             )
         else:
-            cred: YouTubeCredentials = create(YouTubeCredentials, flush=True)
-            async with preview.session.get(
-                "https://www.googleapis.com/youtube/v3/videos",
-                params={
-                    "part": "snippet,statistics,status",
-                    "id": video_id,
-                    "key": cred.token,
-                },
-            ) as res:
-                video = await res.json()
+            video = await video_batcher.get(preview.session, video_id)
+            check_response(video, "video", video_id)
             logger.success(f"[YouTubePreview] Done fetching video: {video_id}")
-
-            async with preview.session.get(
-                "https://www.googleapis.com/youtube/v3/channels",
-                params={
-                    "part": "snippet,statistics",
-                    "id": video["items"][0]["snippet"]["channelId"],
-                    "key": cred.token,
-                },
-            ) as res:
-                channel = await res.json()
-            logger.success(f"[YouTubePreview] Done fetching channel: {video_id}")
             preview.jinja_data.setdefault("_meta", {})[
                 "fetch_time"
             ] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            preview.save_to_cache(
-                json.dumps(video, indent=2, ensure_ascii=False),
-                identifier=["video.json"],
-            )
-            preview.save_to_cache(
-                json.dumps(channel, indent=2, ensure_ascii=False),
-                identifier=["channel.json"],
-            )
+            preview.save_to_cache(encode(video), identifier=["video.json"])
+
+        snippet = video["items"][0]["snippet"]
+        channel, _ = await asyncio.gather(
+            fetch_channel(preview, snippet["channelId"]),
+            preview.cache(
+                snippet["thumbnails"]["maxres"]["url"],
+                identifier=["video-thumbnail-maxres"],
+            ),
+        )
 
         preview.jinja_data.update({"post": await to_jinja(preview, video, channel)})
         return preview
@@ -142,6 +234,7 @@ async def youtube_preview_impl(preview: LinkPreview, video_id: str) -> LinkPrevi
 def youtube_preview_full(domain: str, url: URL) -> LinkPreview:
     preview = LinkPreview()
     if match := VIDEO_LINK_PATTERN.search(str(url)):
+        preview.set_key("youtube", match.group("video_id"))
         return preview.set_coroutine(
             youtube_preview_impl(preview, match.group("video_id"))
         )
@@ -154,6 +247,7 @@ def youtube_preview_full(domain: str, url: URL) -> LinkPreview:
 def youtube_preview_short(domain: str, url: URL) -> LinkPreview:
     preview = LinkPreview()
     if match := SHORT_LINK_PATTERN.search(str(url)):
+        preview.set_key("youtube", match.group("video_id"))
         return preview.set_coroutine(
             youtube_preview_impl(preview, match.group("video_id"))
         )
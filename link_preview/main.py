@@ -1,16 +1,28 @@
+import asyncio
 from contextlib import suppress
 
 from avilla.core import Message, Picture, RawResource
 from avilla.core.context import Context
+from avilla.standard.core.application import ApplicationClosing, ApplicationReady
 from avilla.standard.core.message import MessageReceived, MessageRevoke
-from graia.amnesia.message import MessageChain
+from avilla.twilight.twilight import Twilight, UnionMatch
+from creart import it
+from graia.amnesia.message import Element, MessageChain
 from graia.saya import Saya
-from graia.saya.builtins.broadcast.shortcut import listen
-from yarl import URL
+from graia.saya.builtins.broadcast.shortcut import dispatch, listen
+from kayaku import create
+from launart import Launart
+from loguru import logger
 
 from mephisto.library.model.metadata import ModuleMetadata
+from mephisto.library.service import DataService
 
-from .exception import SkipLink
+from .base import LinkPreview
+from .batch import BatchConfig, async_stack_images, generate_previews
+from .cache import cache_index
+from .codec import CodecConfig, migrate_cache
+from .resolver import link_resolver
+from .table import LinkPreviewCacheTable, LinkPreviewShortLinkTable
 from .utils import can_preview, extract_link, preview_link
 from .whitelist import whitelisted
 
@@ -34,6 +46,39 @@ saya.mount(f"{module.identifier}.can_preview", can_preview)
 saya.mount(f"{module.identifier}.extract_link", extract_link)
 saya.mount(f"{module.identifier}.preview_link", preview_link)
 saya.mount(f"{module.identifier}.whitelisted", whitelisted)
+saya.mount(f"{module.identifier}.cache_report", cache_index.report)
+
+
+@listen(ApplicationReady)
+async def init():
+    logger.info("[LinkPreview] Initializing database")
+    main_engine = await it(Launart).get_component(DataService).registry.create("main")
+    await main_engine.create(LinkPreviewCacheTable)
+    await main_engine.create(LinkPreviewShortLinkTable)
+    logger.success("[LinkPreview] Initialized database")
+    await cache_index.rebuild()
+    await link_resolver.load()
+    asyncio.create_task(cache_index.run())
+
+
+@listen(ApplicationClosing)
+async def shutdown():
+    from .impl.twitter import twitter_pages
+
+    await twitter_pages.close()
+
+
+@listen(MessageReceived)
+@dispatch(Twilight(UnionMatch("/linkpreview"), UnionMatch("migrate")))
+async def migrate(ctx: Context, message: Message):
+    cfg: CodecConfig = create(CodecConfig, flush=True)
+    if not any(ctx.client.to_selector().follows(op) for op in cfg.operators):
+        return
+    await ctx.scene.send_message("[LinkPreview] 正在迁移缓存", reply=message)
+    migrated, failed = await migrate_cache()
+    await ctx.scene.send_message(
+        f"[LinkPreview] 已迁移 {migrated} 个缓存文件, {failed} 个失败", reply=message
+    )
 
 
 @listen(MessageReceived)
@@ -43,27 +88,75 @@ async def link_preview(ctx: Context, message: Message):
     if not (links := extract_link(str(message.content))):
         return
 
-    try:
-        preview = preview_link(URL(links[0]))
-        indicator = await ctx.scene.send_message(
-            "[LinkPreview] 正在生成预览", reply=message
-        )
-
+    cfg: BatchConfig = create(BatchConfig, flush=True)
+    links = list(dict.fromkeys(links))[: max(cfg.max_links, 1)]
+    errors: list[Exception] = []
+    previews: list[LinkPreview] = []
+    for link in links:
         try:
-            await preview.run()
-        except SkipLink:
-            return ctx.staff.call_fn(MessageRevoke.revoke, indicator.to_selector())
+            preview = preview_link(link)
+            if preview.key is not None and any(
+                preview.key == previous.key for previous in previews
+            ):
+                preview.close()
+                continue
+            previews.append(preview)
+        except Exception as e:
+            errors.append(e)
+            await ctx.scene.send_message(
+                f"[LinkPreview] 未能生成预览: {type(e).__name__}: {e}"
+            )
+    if not previews:
+        if errors:
+            raise errors[0]
+        return
 
-        await ctx.scene.send_message(
-            MessageChain([Picture(RawResource(await preview.render()))])
-        )
+    indicator = await ctx.scene.send_message(
+        (
+            "[LinkPreview] 正在生成预览"
+            if len(previews) == 1
+            else f"[LinkPreview] 正在生成 {len(previews)} 个预览"
+        ),
+        reply=message,
+    )
+    tasks = generate_previews(previews)
+    images: list[bytes] = []
+    media: list[Element] = []
+    try:
+        for task in tasks:
+            try:
+                image, preview = await task
+                if image is None:
+                    continue
+            except Exception as e:
+                errors.append(e)
+                await ctx.scene.send_message(
+                    f"[LinkPreview] 未能生成预览: {type(e).__name__}: {e}"
+                )
+                continue
+            if cfg.stack and len(previews) > 1:
+                images.append(image)
+                media.extend(preview.extra_media)
+                continue
+            await ctx.scene.send_message(MessageChain([Picture(RawResource(image))]))
+            for element in preview.extra_media:
+                with suppress(Exception):
+                    await ctx.scene.send_message(element)
+        if images:
+            for image in await async_stack_images(images, cfg.stack_quality):
+                await ctx.scene.send_message(
+                    MessageChain([Picture(RawResource(image))])
+                )
+            for element in media:
+                with suppress(Exception):
+                    await ctx.scene.send_message(element)
+    finally:
+        for task in tasks:
+            task.cancel()
         with suppress(Exception):
             await ctx.staff.call_fn(MessageRevoke.revoke, indicator.to_selector())
-        for media in preview.extra_media:
-            with suppress(Exception):
-                await ctx.scene.send_message(media)
-    except Exception as e:
-        await ctx.scene.send_message(
-            f"[LinkPreview] 未能生成预览: {type(e).__name__}: {e}"
-        )
-        raise e
+
+    if len(errors) == 1:
+        raise errors[0]
+    if errors:
+        raise ExceptionGroup("Multiple exceptions occurred.", errors)
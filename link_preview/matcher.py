@@ -0,0 +1,75 @@
+import re
+
+
+class LinkMatcher:
+    patterns: list[re.Pattern]
+    hints: list[str | None]
+    _compiled: dict[tuple[int, ...], tuple[re.Pattern, list[int]] | None]
+
+    def __init__(self, patterns: dict[re.Pattern, str | None]):
+        self.patterns = list(patterns)
+        self.hints = list(patterns.values())
+        self._compiled = {}
+
+    def _candidates(self, text: str) -> tuple[int, ...]:
+        return tuple(
+            index
+            for index, hint in enumerate(self.hints)
+            if hint is None or hint in text
+        )
+
+    def _compile(
+        self, candidates: tuple[int, ...]
+    ) -> tuple[re.Pattern, list[int]] | None:
+        if candidates not in self._compiled:
+            parts, groups, offset = [], [], 1
+            for index in candidates:
+                pattern = self.patterns[index]
+                parts.append(f"(?P<_link_{index}>{pattern.pattern})")
+                groups.append(offset + 1 if pattern.groups else offset)
+                offset += pattern.groups + 1
+            try:
+                self._compiled[candidates] = re.compile("|".join(parts)), groups
+            except re.error:
+                self._compiled[candidates] = None
+        return self._compiled[candidates]
+
+    def _findall_each(self, text: str, candidates: tuple[int, ...]) -> list[str]:
+        found = sorted(
+            (
+                match.start(),
+                index,
+                match.end(),
+                match.group(1 if match.re.groups else 0),
+            )
+            for index in candidates
+            for match in self.patterns[index].finditer(text)
+        )
+        result, end = [], 0
+        for start, _, stop, url in found:
+            if start >= end:
+                result.append(url)
+                end = stop
+        return result
+
+    def findall(self, text: str) -> list[str]:
+        # Matches never overlap, as with a single regex: at any position the
+        # earliest registered pattern wins and a link is reported only once.
+        if not (candidates := self._candidates(text)):
+            return []
+        if (compiled := self._compile(candidates)) is None:
+            return self._findall_each(text, candidates)
+        combined, groups = compiled
+        return [
+            match.group(
+                groups[candidates.index(int(match.lastgroup.removeprefix("_link_")))]
+            )
+            for match in combined.finditer(text)
+        ]
+
+    def match(self, text: str) -> bool:
+        if not (candidates := self._candidates(text)):
+            return False
+        if (compiled := self._compile(candidates)) is None:
+            return any(self.patterns[index].match(text) for index in candidates)
+        return compiled[0].match(text) is not None
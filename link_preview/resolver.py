@@ -0,0 +1,146 @@
+import re
+import time
+
+from aiohttp import ClientResponse, ClientSession, ClientTimeout
+from creart import it
+from kayaku import config, create
+from launart import Launart
+from loguru import logger
+from sqlalchemy import delete, insert, select
+from yarl import URL
+
+from mephisto.library.model.metadata import ModuleMetadata
+from mephisto.library.service import DataService, SessionService
+
+from .flight import singleflight
+from .table import LinkPreviewShortLinkTable
+
+module = ModuleMetadata.current()
+
+
+@config(f"{module.identifier}.resolver")
+class ResolverConfig:
+    max_hops: int = 5
+    timeout: float = 5.0
+    negative_ttl: int = 24 * 60 * 60
+
+
+class LinkResolver:
+    links: dict[str, tuple[str | None, float]]
+
+    def __init__(self):
+        self.links = {}
+
+    @property
+    def session(self) -> ClientSession:
+        return it(Launart).get_component(SessionService).get(module.identifier)
+
+    @staticmethod
+    def _short(url: URL | str) -> str:
+        url = str(url)
+        if not url.startswith("http"):
+            url = f"https://{url}"
+        return str(URL(url).with_scheme("https").with_fragment(None))
+
+    async def load(self):
+        main_engine = (
+            await it(Launart).get_component(DataService).registry.create("main")
+        )
+        rows = (
+            await main_engine.execute(
+                select(
+                    LinkPreviewShortLinkTable.short,
+                    LinkPreviewShortLinkTable.target,
+                    LinkPreviewShortLinkTable.resolved,
+                )
+            )
+        ).fetchall()
+        for short, target, resolved in rows:
+            self.links.setdefault(short, (target, resolved))
+        logger.success(f"[LinkPreview] Loaded {len(self.links)} short link(s)")
+
+    async def _save(self, short: str, target: str | None):
+        resolved = time.time()
+        self.links[short] = target, resolved
+        try:
+            main_engine = (
+                await it(Launart).get_component(DataService).registry.create("main")
+            )
+            await main_engine.execute(
+                delete(LinkPreviewShortLinkTable).where(
+                    LinkPreviewShortLinkTable.short == short
+                )
+            )
+            await main_engine.execute(
+                insert(LinkPreviewShortLinkTable).values(
+                    short=short, target=target, resolved=resolved
+                )
+            )
+        except Exception as e:
+            logger.warning(f"[LinkPreview] Failed to persist short link {short}: {e}")
+
+    @staticmethod
+    def _check(res: ClientResponse):
+        if res.status >= 400 and res.status not in (404, 410):
+            res.raise_for_status()
+
+    async def _hop(
+        self, url: str, cfg: ResolverConfig, headers: dict[str, str] | None
+    ) -> tuple[int, str | None]:
+        options = {
+            "allow_redirects": False,
+            "timeout": ClientTimeout(total=cfg.timeout),
+            "headers": headers,
+        }
+        async with self.session.head(url, **options) as res:
+            if res.status != 405:
+                self._check(res)
+            status, location = res.status, res.headers.get("Location")
+        if status == 405:
+            async with self.session.get(url, **options) as res:
+                self._check(res)
+                status, location = res.status, res.headers.get("Location")
+        return status, str(URL(url).join(URL(location))) if location else None
+
+    async def _resolve(
+        self, short: str, pattern: re.Pattern, headers: dict[str, str] | None
+    ) -> str | None:
+        cfg: ResolverConfig = create(ResolverConfig, flush=True)
+        url = short
+        for _ in range(max(cfg.max_hops, 1)):
+            status, location = await self._hop(url, cfg, headers)
+            if location is None:
+                if status in (404, 410):
+                    logger.debug(f"[LinkPreview] Short link is gone: {short}")
+                    await self._save(short, None)
+                else:
+                    logger.debug(f"[LinkPreview] Short link leads nowhere: {short}")
+                return None
+            if pattern.search(url := location):
+                logger.debug(f"[LinkPreview] Resolved short link: {short} -> {url}")
+                await self._save(short, url)
+                return url
+        logger.debug(f"[LinkPreview] Short link redirects too often: {short}")
+        return None
+
+    async def resolve(
+        self,
+        url: URL | str,
+        pattern: re.Pattern,
+        *,
+        headers: dict[str, str] | None = None,
+    ) -> str | None:
+        short = self._short(url)
+        if (cached := self.links.get(short)) is not None:
+            target, resolved = cached
+            if target is not None:
+                return target
+            cfg: ResolverConfig = create(ResolverConfig)
+            if time.time() - resolved < cfg.negative_ttl:
+                return None
+        return await singleflight(
+            ("resolve", short), lambda: self._resolve(short, pattern, headers)
+        )
+
+
+link_resolver = LinkResolver()
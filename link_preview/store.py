@@ -0,0 +1,84 @@
+import time
+from dataclasses import field
+from hashlib import sha256
+
+from kayaku import config, create
+from loguru import logger
+from yarl import URL
+
+from mephisto.library.model.metadata import ModuleMetadata
+from mephisto.library.util.storage import File, download_file
+
+from .cache import cache_index
+from .flight import singleflight
+
+module = ModuleMetadata.current()
+
+
+@config(f"{module.identifier}.store")
+class StoreConfig:
+    ttl: dict[str, int] = field(
+        default_factory=lambda: {
+            "avatar": 24 * 60 * 60,
+            "live": 60,
+            "media": 30 * 24 * 60 * 60,
+        }
+    )
+    default_ttl: int = 24 * 60 * 60
+
+
+def normalize_url(url: URL | str) -> str:
+    url = URL(str(url)).with_fragment(None)
+    return str(url.with_query(sorted(url.query.items())))
+
+
+class AssetStore:
+    @staticmethod
+    def _blob(digest: str) -> File:
+        return File(*module.identifier.split("."), "store", "blob", digest[:2], digest)
+
+    @staticmethod
+    def _pointer(kind: str, url: URL | str) -> File:
+        key = sha256(normalize_url(url).encode()).hexdigest()
+        return File(*module.identifier.split("."), "store", kind, key[:2], key)
+
+    def blob(self, digest: str) -> File | None:
+        file = self._blob(digest)
+        return file if cache_index.lookup(file.path) else None
+
+    def resolve(self, url: URL | str, kind: str) -> File | None:
+        pointer = self._pointer(kind, url)
+        if not (entry := cache_index.lookup(pointer.path)):
+            return None
+        cfg: StoreConfig = create(StoreConfig, flush=True)
+        if time.time() - entry.created > cfg.ttl.get(kind, cfg.default_ttl):
+            return None
+        return self.blob(pointer.read_text())
+
+    def put(self, url: URL | str, kind: str, data: bytes) -> File:
+        digest = sha256(data).hexdigest()
+        blob = self._blob(digest)
+        if not blob.exists:
+            blob.write_bytes(data)
+            cache_index.record(blob.path, len(data))
+        else:
+            logger.debug(f"[LinkPreview] Reusing stored asset: {digest}")
+        pointer = self._pointer(kind, url)
+        pointer.write_text(digest)
+        cache_index.record(pointer.path, len(digest))
+        return blob
+
+    async def fetch(self, url: URL | str, kind: str = "media", **kwargs) -> File:
+        if (blob := self.resolve(url, kind)) is not None:
+            logger.debug(f"[LinkPreview] Using stored asset: {url}")
+            return blob
+
+        async def _download() -> File:
+            logger.debug(f"[LinkPreview] Downloading asset: {url}")
+            data = await download_file(url, session_name=module.identifier, **kwargs)
+            return self.put(url, kind, data)
+
+        return await singleflight(("asset", kind, normalize_url(url)), _download)
+
+
+asset_store = AssetStore()
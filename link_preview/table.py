@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Float, Integer, String, Text
+
+from mephisto.library.util.orm.base import Base
+
+
+class LinkPreviewCacheTable(Base):
+    __tablename__ = "link_preview_cache"
+
+    id = Column(Integer(), primary_key=True)
+    path = Column(Text())
+
+    platform = Column(String(length=64))
+    size = Column(Integer())
+    hits = Column(Integer())
+    created = Column(Float())
+    last_access = Column(Float())
+    ttl = Column(Integer())
+
+
+class LinkPreviewShortLinkTable(Base):
+    __tablename__ = "link_preview_short_link"
+
+    id = Column(Integer(), primary_key=True)
+    short = Column(Text())
+
+    target = Column(Text(), nullable=True)
+    resolved = Column(Float())
@@ -1,37 +1,46 @@
 import re
 from contextlib import suppress
 from pathlib import Path
-from typing import Awaitable, Final
+from typing import Awaitable, Callable, Final
 
 from flywheel import FnCollectEndpoint, SimpleOverload
+from flywheel.globals import iter_layout
 from yarl import URL
 
 from mephisto.library.model.metadata import ModuleMetadata
 
 from .base import LinkPreview
 from .exception import InvalidLink
+from .matcher import LinkMatcher
 
 module = ModuleMetadata.current()
 
 TEMPLATE_DIR: Final[Path] = Path(__file__).parent / "templates"
 PLACEHOLDER: Final[Path] = Path(__file__).parent / "assets" / "placeholder.png"
 
-_patterns: set[re.Pattern] = set()
+_patterns: dict[re.Pattern, str | None] = {}
+_matcher: LinkMatcher | None = None
 
 
-def register_link_pattern(pattern: re.Pattern):
-    _patterns.add(pattern)
+def _get_matcher() -> LinkMatcher:
+    global _matcher
+    if _matcher is None:
+        _matcher = LinkMatcher(_patterns)
+    return _matcher
+
+
+def register_link_pattern(pattern: re.Pattern, hint: str | None = None):
+    global _matcher
+    _patterns[pattern] = hint
+    _matcher = None
 
 
 def can_preview(link: URL | str) -> bool:
-    return any(pattern.match(str(link)) for pattern in _patterns)
+    return _get_matcher().match(str(link))
 
 
 def extract_link(text: str) -> list[URL]:
-    result = []
-    for pattern in _patterns:
-        result.extend([URL(url) for url in pattern.findall(text)])
-    return result
+    return [URL(url) for url in _get_matcher().findall(text)]
 
 
 DOMAIN_OVERLOAD = SimpleOverload("domain")
@@ -56,38 +65,93 @@ def impl_preview_scheme(scheme: str):
     return shape
 
 
+_dispatch: dict[tuple[str, str], tuple[tuple, Callable | None]] = {}
+
+
+def _select(endpoint, overload: SimpleOverload, value: str):
+    selected = None
+    with suppress(NotImplementedError):
+        for selection in endpoint.select():
+            if not selection.harvest(overload, value):
+                continue
+
+            selection.complete()
+            selected = selection
+    return selected
+
+
+def _collected(endpoint, overload: SimpleOverload) -> tuple:
+    signature = endpoint.signature
+    return tuple(
+        (
+            id(layer),
+            (
+                len(record.scopes.get(overload.name, ()))
+                if (record := layer.fn_implements.get(signature)) is not None
+                else 0
+            ),
+        )
+        for layer in iter_layout(endpoint)
+    )
+
+
+def _lookup(
+    kind: str, endpoint, overload: SimpleOverload, value: str, collected: tuple
+) -> Callable[[str, URL], LinkPreview] | None:
+    # Handlers can be collected after the first lookup without registering a
+    # new pattern, so a memoized result is only reused while the collection
+    # it was selected from is unchanged.
+    if (cached := _dispatch.get((kind, value))) is None or cached[0] != collected:
+        cached = _dispatch[kind, value] = collected, _select(endpoint, overload, value)
+    return cached[1]
+
+
+def _domain_candidates(host: str):
+    labels = host.lower().rstrip(".").split(".")
+    for index in range(max(len(labels) - 1, 1)):
+        yield ".".join(labels[index:])
+
+
+def _dispatch_domain(host: str) -> tuple[str, Callable[[str, URL], LinkPreview]]:
+    collected = _collected(impl_preview_domain, DOMAIN_OVERLOAD)
+    for domain in _domain_candidates(host):
+        handler = _lookup(
+            "domain", impl_preview_domain, DOMAIN_OVERLOAD, domain, collected
+        )
+        if handler is not None:
+            return domain, handler
+    raise NotImplementedError(f"Preview for domain {host} is not implemented.")
+
+
+def _dispatch_scheme(scheme: str) -> Callable[[str, URL], LinkPreview]:
+    collected = _collected(impl_preview_scheme, SCHEME_OVERLOAD)
+    handler = _lookup("scheme", impl_preview_scheme, SCHEME_OVERLOAD, scheme, collected)
+    if handler is None:
+        raise NotImplementedError(f"Preview for scheme {scheme} is not implemented.")
+    return handler
+
+
 def preview_domain(url: URL) -> LinkPreview:
     if not url.scheme:
         url = URL(f"https://{url}")
-    if not (domain := url.host):
+    if not url.host:
         raise InvalidLink(url)
-    for selection in impl_preview_domain.select():
-        if not selection.harvest(DOMAIN_OVERLOAD, domain):
-            continue
-
-        selection.complete()
-
-    return selection(domain, url)  # type: ignore  # noqa
+    domain, handler = _dispatch_domain(url.host)
+    return handler(domain, url)
 
 
 def preview_scheme(url: URL) -> LinkPreview:
     if not (scheme := url.scheme):
         raise InvalidLink(url)
-    for selection in impl_preview_scheme.select():
-        if not selection.harvest(SCHEME_OVERLOAD, scheme):
-            continue
-
-        selection.complete()
-
-    return selection(scheme, url)  # type: ignore  # noqa
+    return _dispatch_scheme(scheme)(scheme, url)
 
 
 def preview_link(url: URL) -> LinkPreview:
     with suppress(NotImplementedError):
-        return preview_domain(url)
+        return preview_domain(url).set_origin(url)
 
     with suppress(NotImplementedError):
-        return preview_scheme(url)
+        return preview_scheme(url).set_origin(url)
 
     raise NotImplementedError(f"Preview for {url} is not implemented.")
 